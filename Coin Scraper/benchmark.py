@@ -0,0 +1,576 @@
+# Offline benchmark and regression check for the coin scraper pipeline
+#
+# Builds a synthetic copy of the site (the coins page and one pools page per coin, laid out
+# like the real tables) or takes recorded pages such as the ones in fixtures/, serves them from
+# a stand-in HTTP server in a separate process and runs every stage against it with each
+# backend: top coins, coin pools, cleaning, number parsing, history and publishing. Reports
+# stage timings, pages, rows and bytes per second and WebDriver round trips. Checks the numbers
+# that end up in the history store against the pages' expected.json, that the backends all
+# produced the same cleaned files, parse_value against PARSE_CASES and that the coin cache
+# only misses when a coin's summary really changed.
+# Everything stays on the local machine.
+#
+# Usage: python benchmark.py [--backends fixtures,http,selenium] [--fixtures DIR] [--output results.json]
+
+
+import argparse
+import collections
+import contextlib
+import hashlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import main
+
+
+# Synthetic site, more rows than the scraper keeps so the limits get exercised
+COINS = 25
+POOLS_PER_COIN = 20
+AD_EVERY = 6                # Every n-th pools row is an ad row the parser has to skip
+PARSE_REPEAT = 20           # Passes over the pages for the parsing rates
+SEED = 1
+
+COUNTRIES = ["United States", "Germany", "Hong Kong", "CN", "Global", "Atlantis"]
+ALGORITHMS = ["SHA-256", "Scrypt", "Ethash", "RandomX", "Equihash"]
+SCHEMES = ["FPPS", "PPS+", "PPLNS"]
+
+# Displayed values and what parse_value has to make of them, coin amounts stay unscaled
+PARSE_CASES = {
+    "123.45 PH/s": 1.2345e17, "1.5 Gh/s": 1.5e9, "3.1 GSol/s": 3.1e9, "5.2K": 5200,
+    "$1.2B": 1.2e9, "$0.0123": 0.0123, "$61,234.50": 61234.5, "1,234": 1234,
+    "0.001 BTC": 0.001, "0.005 BTC": 0.005, "0.1 BCH": 0.1, "1 ETC": 1,
+    "0.5 ZEC": 0.5, "100 ERG": 100, "4 KMD": 4, "No Data": None, "": None,
+}
+
+
+# Ticker letters start at B, so every coin amount tries to pass for a "billion"
+def coin_name(i):
+    return f"Bench{i}", "B" + chr(65 + i // 26) + chr(65 + i % 26)
+
+
+# A display value and the number it stands for, text is format applied to the number rounded to places
+def shown(number, places, template="{}", scale=1):
+    text = f"{number:,.{places}f}"
+    return template.format(text), float(text.replace(",", "")) * scale
+
+
+# Pages of the synthetic site by fixture name (index for "/", <coin> for "/<coin>") and the
+# expected.json numbers for the coins and pools the scraper keeps. Pools rows put each kept
+# value where KEEP_INDEXES picks it up under its KEEP_HEADER name, like the pages in fixtures/
+def make_site(coins, pools_per_coin, seed):
+    rng = random.Random(seed)
+    pages = {}
+    expected = {"coins": [], "pools": []}
+
+    coin_rows = []
+    for i in range(coins):
+        name, ticker = coin_name(i)
+        market_cap, market_cap_usd = shown(rng.uniform(1, 900), 1, "${}M", 1e6)
+        price, price_usd = shown(rng.uniform(0.001, 100), 4, "${}")
+        change, change_fraction = shown(rng.uniform(-20, 20), 2, "{}%", 0.01)
+        hashrate, hashrate_hs = shown(rng.uniform(1, 999), 2, "{} PH/s", 1e15)
+        cells = [
+            f"{i + 1}.",
+            f"<a href=\"/{name.lower()}\">{name}</a><br><span>{ticker}</span>",
+            rng.choice(ALGORITHMS),
+            market_cap,
+            f"${rng.uniform(1, 900):.1f}K",
+            price,
+            change,
+            f"${rng.uniform(1, 900):.1f}K",
+            str(rng.randint(1, 80)),
+            hashrate,
+            f"{rng.uniform(1, 999):.2f} PH/s",
+            "",
+            f"<div>{rng.randint(1, 59)}m ago</div><div>{rng.randint(10**5, 10**7)}</div>",
+        ]
+        coin_rows.append("<tr>" + "".join(f"<td>{cell}</td>" for cell in cells) + "</tr>")
+
+        if i < 20:
+            expected["coins"].append({
+                "coin": name.lower(), "market_cap_usd": market_cap_usd, "price_usd": price_usd,
+                "change_7d_fraction": change_fraction, "pools_hashrate_hs": hashrate_hs,
+            })
+
+        pool_rows = []
+        for j in range(pools_per_coin):
+            if j and j % AD_EVERY == 0:
+                pool_rows.append('<tr class="show1100"><td colspan="12">Advertisement</td></tr>')
+
+            pps, pps_usd = shown(rng.uniform(0.01, 1), 4, "${}")
+            min_pay, min_pay_value = shown(rng.uniform(0.001, 1), 3, "{} " + ticker)
+            miners, miners_count = shown(rng.randint(1, 50000), 0)
+            pool_hashrate, pool_hashrate_hs = shown(rng.uniform(1, 999), 2, "{} TH/s", 1e12)
+            share, share_fraction = shown(rng.uniform(0.1, 30), 2, "{}%", 0.01)
+            pool = f"pool{j}-{name.lower()}.com"
+            cells = [
+                f"{j + 1}.",
+                f"<img alt=\"\"> {rng.choice(COUNTRIES)}\n   {pool}<span>+{rng.randint(1, 9)}</span>",
+                rng.choice(SCHEMES),
+                f"{rng.uniform(0, 3):.1f}%",
+                pps,
+                min_pay,
+                miners,
+                f"{rng.randint(1, 99)}+{rng.randint(1, 9)}: {rng.randint(1, 59)}m",
+                pool_hashrate,
+                share,
+                str(rng.randint(10**5, 10**7)),
+                f"{rng.randint(1, 59)}m ago",
+            ]
+            pool_rows.append("<tr>" + "".join(f"<td>{cell}</td>" for cell in cells) + "</tr>")
+
+            if i < 20 and j < 15:
+                expected["pools"].append({
+                    "coin": name.lower(), "pool": pool, "pps_usd": pps_usd, "min_pay_value": min_pay_value,
+                    "miners_count": miners_count, "hashrate_hs": pool_hashrate_hs, "hashrate_fraction": share_fraction,
+                })
+
+        pages[name.lower()] = page("pools", pool_rows)
+
+    pages["index"] = page("coins", coin_rows)
+    return pages, expected
+
+
+# A page with the table in it, and a script mentioning the table id like the real site's
+def page(table_id, rows):
+    return (
+        "<!DOCTYPE html><html><head>"
+        f"<script>var selector = \"<table id='{table_id}'>\";</script></head><body>"
+        f"<table id=\"{table_id}\"><thead><tr><th>#</th></tr></thead><tbody>\n"
+        + "\n".join(rows)
+        + "\n</tbody></table></body></html>"
+    )
+
+
+def write_site(pages, expected, directory):
+    for name, html in pages.items():
+        with open(os.path.join(directory, f"{name}.html"), "w", encoding="utf-8") as f:
+            f.write(html)
+
+    with open(os.path.join(directory, "expected.json"), "w", encoding="utf-8") as f:
+        json.dump(expected, f, indent=2)
+
+
+# expected.json next to the pages, None when the pages come without one
+def load_expected(directory):
+    try:
+        with open(os.path.join(directory, "expected.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+# Compares the latest stored row of every expected coin and pool with its expected numbers,
+# returns a description of each mismatch. null in expected.json means no number
+def check_values(history_path, expected):
+    history = main.HistoryStore(history_path)
+    mismatches = []
+
+    try:
+        for table, keys in (("coins", ["coin"]), ("pools", ["coin", "pool"])):
+            for entry in expected.get(table, []):
+                key = {column: entry[column] for column in keys}
+                where = " AND ".join(f"{column} = ?" for column in key)
+                row = history.db.execute(
+                    f"SELECT * FROM {table} WHERE {where} ORDER BY first_seen DESC LIMIT 1", list(key.values())
+                ).fetchone()
+
+                label = "/".join(str(value) for value in key.values())
+                if row is None:
+                    mismatches.append(f"{table} {label}: missing")
+                    continue
+
+                for column, want in entry.items():
+                    if column in key:
+                        continue
+
+                    got = row[column]
+                    if want is None or got is None or isinstance(want, str):
+                        matched = got == want
+                    else:
+                        matched = math.isclose(got, want, rel_tol=1e-9)
+                    if not matched:
+                        mismatches.append(f"{table} {label} {column}: {got!r}, expected {want!r}")
+    finally:
+        history.close()
+
+    return mismatches
+
+
+# Runs in its own process so the server does not share a GIL with the scraper.
+# Serves <name>.html from the directory for "/<name>" ("/" is index.html), sends
+# back its port, then serves until told to stop
+def serve_pages(directory, conn):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, like the real site
+
+        def do_GET(self):
+            name = os.path.basename(self.path.split("?", 1)[0].strip("/")) or "index"
+            try:
+                with open(os.path.join(directory, f"{name}.html"), "rb") as f:
+                    data = f.read()
+            except OSError:
+                self.send_error(404)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    conn.send(server.server_port)
+
+    try:
+        conn.recv()
+    except EOFError:
+        pass
+    server.shutdown()
+
+
+# Counts the WebDriver commands (one HTTP round trip to geckodriver each) sent by the sessions
+class RpcCounter:
+    def __init__(self):
+        self.commands = collections.Counter()
+        self.lock = threading.Lock()
+
+    def wrap(self, driver):
+        execute = driver.execute
+
+        def counted(command, params=None):
+            with self.lock:
+                self.commands[command] += 1
+            return execute(command, params)
+
+        driver.execute = counted
+
+    def total(self):
+        with self.lock:
+            return sum(self.commands.values())
+
+
+# Runs one stage with its console output swallowed, returns (result, stage report)
+def run_stage(function, rpcs=None):
+    before = rpcs.total() if rpcs else 0
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+
+    stage = {"elapsed_s": round(elapsed, 6)}
+    if rpcs:
+        stage["webdriver_rpcs"] = rpcs.total() - before
+    return result, stage
+
+
+def rate(count, elapsed):
+    return round(count / elapsed, 1) if elapsed else None
+
+
+def make_bench_backend(name, base_url, fixture_dir):
+    limiter = main.DomainRateLimiter(0)  # No politeness delay against the local server
+
+    if name == "fixtures":
+        return main.FixtureBackend(fixture_dir)
+    if name == "http":
+        return main.HttpBackend(base_url, limiter)
+    if name == "selenium":
+        return main.SeleniumBackend(base_url, limiter)
+    raise RuntimeError(f"Unknown backend {name}")
+
+
+# Every stage of a run with one backend, against its own output and web dirs
+def run_backend(name, base_url, fixture_dir, work_dir, expected=None):
+    backend = make_bench_backend(name, base_url, fixture_dir)
+
+    main.FINAL_OUTPUT_DIR = os.path.join(work_dir, "output")
+    main.CLEANED_POOLS_DIR = os.path.join(main.FINAL_OUTPUT_DIR, "cleaned_pools")
+    main.WEB_DIR = os.path.join(work_dir, "web")
+    main.ensure_dirs()
+
+    stages = {}
+    rpcs = None
+
+    try:
+        if name == "selenium":
+            rpcs = RpcCounter()
+            _, stages["browser_start"] = run_stage(backend.start)
+            for driver in backend.drivers:
+                rpcs.wrap(driver)
+
+        top_coins, stage = run_stage(lambda: main.scrape_top_coins(backend), rpcs)
+        stages["top_coins"] = {**stage, "pages": 1, "rows": len(top_coins)}
+
+        pools, stage = run_stage(lambda: list(main.scrape_coin_pools(backend, top_coins)), rpcs)
+        raw_rows = sum(len(rows) for _, _, rows in pools)
+        stages["coin_pools"] = {
+            **stage,
+            "pages": len(top_coins),
+            "pages_per_second": rate(len(top_coins), stage["elapsed_s"]),
+            "rows": raw_rows,
+        }
+    finally:
+        backend.close()
+
+    cleaned, stage = run_stage(lambda: {coin: (file_name, list(main.clean_rows(rows))) for coin, file_name, rows in pools})
+    cleaned_rows = sum(len(rows) for _, rows in cleaned.values())
+    stages["clean"] = {**stage, "rows": cleaned_rows, "rows_per_second": rate(raw_rows, stage["elapsed_s"])}
+
+    all_rows = [row for _, rows in cleaned.values() for row in rows]
+    columns = {column: [row[i] for row in all_rows] for i, column in enumerate(main.POOL_COLUMNS)}
+    numeric, stage = run_stage(lambda: main.parse_columns(columns, main.POOL_NUMERIC))
+    stages["numeric"] = {**stage, "rows": len(all_rows), "rows_per_second": rate(len(all_rows), stage["elapsed_s"])}
+
+    history_path = os.path.join(work_dir, "history.sqlite3")
+
+    def record():
+        history = main.HistoryStore(history_path)
+        history.record_coins(top_coins, 1)
+        for coin, (file_name, rows) in cleaned.items():
+            history.record_pools(coin, rows, 1)
+        history.close()
+
+    _, stage = run_stage(record)
+    stored = len(top_coins) + cleaned_rows
+    stages["history"] = {**stage, "rows": stored, "rows_per_second": rate(stored, stage["elapsed_s"])}
+
+    # A first publish writes everything, the second finds every file unchanged like the next run would
+    manifest = os.path.join(main.FINAL_OUTPUT_DIR, "published.json")
+    for stage_name in ("publish", "publish_unchanged"):
+        def publish():
+            publisher = main.Publisher(main.WEB_DIR, manifest)
+            publisher.publish("Top20Coins.csv", main.TOP_COINS_HEADER, top_coins, main.FINAL_OUTPUT_DIR)
+            for coin, (file_name, rows) in sorted(cleaned.items()):
+                publisher.publish(file_name, main.KEEP_HEADER, rows, main.CLEANED_POOLS_DIR)
+            return publisher, main.publish_to_web(publisher)
+
+        (publisher, zip_path), stage = run_stage(publish)
+        published = sum(len(data) for data in publisher.results.values()) + os.path.getsize(zip_path)
+        stages[stage_name] = {
+            **stage,
+            "files_written": publisher.changed,
+            "bytes": published,
+            "bytes_per_second": rate(published, stage["elapsed_s"]),
+        }
+
+    digest = hashlib.sha256()
+    for file_name, data in sorted(publisher.results.items()):
+        digest.update(file_name.encode("utf-8") + b"\0" + data)
+
+    run = {
+        "backend": name,
+        "stages": stages,
+        "total_s": round(sum(stage["elapsed_s"] for stage in stages.values()), 4),
+        "coins": len(top_coins),
+        "coins_scraped": len(pools),
+        "pool_rows": cleaned_rows,
+        "unparsed_hashrates": sum(value is None for value in numeric["hashrate_hs"]),
+        "output_sha256": digest.hexdigest(),
+    }
+    if expected:
+        run["value_mismatches"] = check_values(history_path, expected)
+    if rpcs:
+        run["webdriver_commands"] = dict(rpcs.commands)
+    return run
+
+
+# Parses every page straight from memory, no fetching, over PARSE_REPEAT passes
+def run_parsing(fixture_dir):
+    pages = []
+    for file_name in sorted(os.listdir(fixture_dir)):
+        if file_name.endswith(".html"):
+            with open(os.path.join(fixture_dir, file_name), encoding="utf-8") as f:
+                pages.append((file_name == "index.html", f.read()))
+
+    def parse():
+        rows = 0
+        for _ in range(PARSE_REPEAT):
+            for is_index, html in pages:
+                if is_index:
+                    rows += len(main.parse_top_coins(main.parse_table(html, "coins", "innerText") or []))
+                else:
+                    rows += len(main.parse_pool_rows(main.parse_table(html, "pools") or []))
+        return rows
+
+    rows, stage = run_stage(parse)
+    size = sum(len(html) for _, html in pages) * PARSE_REPEAT
+    return {
+        **stage,
+        "pages": len(pages) * PARSE_REPEAT,
+        "rows": rows,
+        "rows_per_second": rate(rows, stage["elapsed_s"]),
+        "bytes_per_second": rate(size, stage["elapsed_s"]),
+    }
+
+
+# The coin cache against snapshots of the coins page: one taken later, where only the
+# "Nm ago" block ages moved, has to hit the cache, one where a new block was found has to miss it
+def check_cache(fixture_dir, work_dir):
+    with open(os.path.join(fixture_dir, "index.html"), encoding="utf-8") as f:
+        html = f.read()
+
+    def snapshot(html):
+        return main.parse_top_coins(main.parse_table(html, "coins", "innerText") or [])
+
+    rows = snapshot(html)
+    later = snapshot(re.sub(r"\d+\s*[smhd] ago", "61m ago", html))
+    new_block = [row[:11] + [row[11] + "1"] + row[12:] for row in later]
+
+    cache = main.CoinCache(os.path.join(work_dir, "coin_cache.json"), ttl=3600)
+    for row in rows:
+        cache.put(row[1], row, f"{row[1]}.csv", [])
+
+    return {
+        "cache_ignores_block_age": bool(rows) and len(later) == len(rows)
+        and all(later[i] != rows[i] and cache.get(row[1], row) for i, row in enumerate(later)),
+        "cache_misses_new_block": bool(rows) and not any(cache.get(row[1], row) for row in new_block),
+    }
+
+
+# What every run has to get right. Counts are only known for the synthetic site,
+# values wherever the pages come with an expected.json
+def check_runs(runs, synthetic, coins, pools_per_coin):
+    checks = {}
+
+    wrong = [text for text, want in PARSE_CASES.items() if main.parse_value(text) != want]
+    for text in wrong:
+        print(f"[!] parse_value({text!r}) is {main.parse_value(text)!r}, expected {PARSE_CASES[text]!r}", file=sys.stderr)
+    checks["parse_cases"] = not wrong
+
+    for run in runs:
+        name = run["backend"]
+        checks[f"{name}_all_coins_scraped"] = run["coins"] > 0 and run["coins_scraped"] == run["coins"]
+
+        if "value_mismatches" in run:
+            for mismatch in run["value_mismatches"]:
+                print(f"[!] {name}: {mismatch}", file=sys.stderr)
+            checks[f"{name}_values"] = not run["value_mismatches"]
+
+        if synthetic:
+            expected_coins = min(coins, 20)
+            checks[f"{name}_top_coins"] = run["coins"] == expected_coins
+            checks[f"{name}_pool_rows"] = run["pool_rows"] == expected_coins * min(pools_per_coin, 15)
+            checks[f"{name}_hashrates_parsed"] = run["unparsed_hashrates"] == 0
+
+    if len(runs) > 1:
+        checks["backends_agree"] = len({run["output_sha256"] for run in runs}) == 1
+
+    return checks
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline benchmark for the coin scraper pipeline")
+    parser.add_argument("--backends", default="fixtures,http", help="comma separated backends: fixtures, http, selenium")
+    parser.add_argument("--fixtures", help=f"recorded pages (index.html, <coin>.html, optional expected.json) to use instead "
+                                           f"of the synthetic site, e.g. {main.FIXTURE_DIR}")
+    parser.add_argument("--coins", type=int, default=COINS, help="coins on the synthetic site")
+    parser.add_argument("--pools", type=int, default=POOLS_PER_COIN, help="pools per coin on the synthetic site")
+    parser.add_argument("--seed", type=int, default=SEED, help="seed for the synthetic site")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args()
+
+
+def run_benchmark():
+    args = parse_args()
+    backends = [backend.strip() for backend in args.backends.split(",") if backend.strip()]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        fixture_dir = args.fixtures
+        if not fixture_dir:
+            fixture_dir = os.path.join(temp_dir, "fixtures")
+            os.makedirs(fixture_dir)
+            write_site(*make_site(args.coins, args.pools, args.seed), fixture_dir)
+        expected = load_expected(fixture_dir)
+
+        parent_conn, child_conn = multiprocessing.Pipe()
+        server = multiprocessing.Process(target=serve_pages, args=(fixture_dir, child_conn), daemon=True)
+        server.start()
+
+        try:
+            base_url = f"http://127.0.0.1:{parent_conn.recv()}"
+            print(f"[+] Serving {fixture_dir} on {base_url}", file=sys.stderr)
+
+            parsing = run_parsing(fixture_dir)
+            cache_checks = check_cache(fixture_dir, temp_dir)
+            print(f"[+] parsing  {parsing['rows_per_second']:>10} rows/s", file=sys.stderr)
+
+            runs = []
+            skipped = {}
+            for name in backends:
+                try:
+                    run = run_backend(name, base_url, fixture_dir, os.path.join(temp_dir, name), expected)
+                except RuntimeError as e:
+                    skipped[name] = str(e)
+                    print(f"[-] {name:<8} skipped: {e}", file=sys.stderr)
+                    continue
+
+                runs.append(run)
+                stages = run["stages"]
+                print(f"[+] {name:<8} {run['total_s']:>8}s  "
+                      f"{stages['coin_pools']['pages_per_second']} pages/s  "
+                      f"clean {stages['clean']['rows_per_second']} rows/s  "
+                      f"publish {stages['publish']['bytes_per_second']} B/s", file=sys.stderr)
+        finally:
+            parent_conn.send("stop")
+            server.join(5)
+
+    checks = {**check_runs(runs, not args.fixtures, args.coins, args.pools), **cache_checks}
+    for name, passed in checks.items():
+        if not passed:
+            print(f"[!] Check failed: {name}", file=sys.stderr)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {
+            "driver_pool_size": main.DRIVER_POOL_SIZE,
+            "http_workers": main.HTTP_WORKERS,
+            "domain_delay": 0,
+            "vectorized": main.pd is not None,
+        },
+        "site": {
+            "fixtures": args.fixtures or "synthetic",
+            "coins": None if args.fixtures else args.coins,
+            "pools_per_coin": None if args.fixtures else args.pools,
+            "seed": None if args.fixtures else args.seed,
+        },
+        "parsing": parsing,
+        "runs": runs,
+        "skipped": skipped,
+        "checks": checks,
+        "passed": all(checks.values()),
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    # Failed checks fail the run, so it can gate changes
+    sys.exit(0 if report["passed"] else 1)
+
+
+if __name__ == "__main__":
+    run_benchmark()
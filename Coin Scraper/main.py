@@ -1,20 +1,49 @@
 import sys
 import os
+import io
+import argparse
 import re
 import time
 import csv
+import json
+import hashlib
+import sqlite3
 import traceback
-import shutil
 import zipfile
 import socket
+import threading
+import queue
+import random
+import signal
 import pytz
+from typing import Dict, Iterable, Iterator, List, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.firefox.service import Service as FirefoxService
-from pyvirtualdisplay import Display
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+
+# The browser and HTTP backends each need their own packages, only the one in use has to be installed
+try:
+    from selenium import webdriver
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.firefox.service import Service as FirefoxService
+    from pyvirtualdisplay import Display
+except ImportError:
+    webdriver = None
+
+try:
+    import urllib3
+except ImportError:
+    urllib3 = None
+
+# Only used to parse big batches of values faster (see parse_columns)
+try:
+    import numpy as np
+    import pandas as pd
+except ImportError:
+    pd = None
 
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -23,11 +52,52 @@ CLEANED_POOLS_DIR = os.path.join(FINAL_OUTPUT_DIR, "cleaned_pools")
 RAW_POOLS_DIR = os.path.join(SCRIPT_DIR, "raw_pool_data")
 WEB_DIR = "/var/www/html/mining_data"  # Web srv directory
 
-# Create all dirs
-os.makedirs(FINAL_OUTPUT_DIR, exist_ok=True)
-os.makedirs(CLEANED_POOLS_DIR, exist_ok=True)
-os.makedirs(RAW_POOLS_DIR, exist_ok=True)
-os.makedirs(WEB_DIR, exist_ok=True)
+# Browser pool setup
+DRIVER_POOL_SIZE = 4          # Firefox sessions scraping coin pages side by side
+MARIONETTE_BASE_PORT = 2828   # Session i uses MARIONETTE_BASE_PORT + i
+DOMAIN_DELAY = 1.5            # Seconds between page loads on one domain, across all sessions
+
+# Publishing setup
+PUBLISH_MANIFEST = os.path.join(FINAL_OUTPUT_DIR, "published.json")  # Content hashes of what is on the web dir
+KEEP_DAYS = 7                 # Files no longer published are removed from the web dir after this long
+
+# History setup, every run's rows go into an SQLite store (see HistoryStore)
+HISTORY_DB = os.path.join(FINAL_OUTPUT_DIR, "history.sqlite3")
+
+# Refresh setup, a coin's pool page is only loaded again when its summary in the top coins
+# table changed or its cached rows are older than the TTL
+COIN_CACHE = os.path.join(FINAL_OUTPUT_DIR, "coin_cache.json")
+COIN_CACHE_TTL = 60 * 60      # Seconds
+COIN_SUMMARY_INDEXES = [8, 9, 11]  # Pools(known), PoolsHashrate, LastBlock Found (its height, see coin_summary)
+
+# Daemon setup, --daemon keeps the backend (display and browser sessions) warm between runs
+DAEMON_INTERVAL = 15 * 60     # Seconds from one run's start to the next
+DAEMON_JITTER = 0.1           # Each wait moves by up to this fraction of the interval either way
+DRIVER_MAX_RSS_MB = 1500      # Sessions whose browser grew past this are restarted between runs
+SESSION_WAIT = 300            # Seconds a page waits for a free browser session
+
+# Fetch backend setup
+# The live site fills its tables in with scripts, so "selenium" renders them in the browser.
+# "http" fetches pages directly (falling back to "selenium") for stand-in servers, "fixtures" reads recorded pages
+BACKEND = "selenium"
+SITE_URL = "https://miningpoolstats.stream"  # Point at a local stand-in server for offline runs
+FIXTURE_DIR = os.path.join(SCRIPT_DIR, "fixtures")  # Recorded pages: index.html and <coin>.html
+HTTP_WORKERS = 4              # Pages fetched at once, and kept-alive connections in the pool
+HTTP_TIMEOUT = 30
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64; rv:115.0) Gecko/20100101 Firefox/115.0"
+
+# Scraped table headers, raw pool rows are only written out when raw dumps are asked for
+TOP_COINS_HEADER = [
+    "Rank", "Coin", "Algorithm", "MarketCap", "Emission(Last 24h)",
+    "Price(USD)", "7Day Price Change", "Volume(Last 24h)",
+    "Pools(known)", "PoolsHashrate", "NetworkHashrate", "LastBlock Found"
+]
+RAW_POOL_HEADER = [
+    "Rank", "Country", "Pool", "PoolFee",
+    "Daily PPS $ / 100 TH", "MinPay", "Miners",
+    "Hashrate", "Network %", "Blocks and Expected Block Diff",
+    "BlockHeight", "LastFound"
+]
 
 # Data cleaning setup
 KEEP_INDEXES = [0, 1, 2, 5, 6, 7, 9, 10]
@@ -42,6 +112,41 @@ ACCEPTED_COUNTRIES = {
     "PORTUGAL", "SINGAPORE", "THAILAND", "BRAZIL", "DENMARK"
 }
 TWO_LETTER_COUNTRY = re.compile(r"^[A-Z]{2}$")
+POOL_DOMAIN = re.compile(r'([a-zA-Z0-9-]+\.(?:com|io|net|org|info|biz|us|cn|uk|de))')
+COIN_TICKER = re.compile(r'([A-Z]{2,})$')
+WHITESPACE = re.compile(r'\s+')
+BLOCK_AGE = re.compile(r'^.*\bago\b\s*')  # "4m ago " in front of the height in LastBlock Found
+
+# Countries of more than one word at the start of the pool cell, by their first word
+MULTI_WORD_COUNTRIES = {
+    "United": ["United States", "United Kingdom"], "North": ["North Korea"],
+    "South": ["South Korea", "South Africa"], "New": ["New Zealand"], "Costa": ["Costa Rica"],
+    "Puerto": ["Puerto Rico"], "Saudi": ["Saudi Arabia"], "Czech": ["Czech Republic"],
+    "Hong": ["Hong Kong"]
+}
+
+# Numbers as displayed, "123.45 PH/s", "1.5 Gh/s", "$1.2B", "1,234", with an SI or money suffix.
+# Hashrates come out in H/s and money in USD. A suffix letter only counts when a rate unit
+# follows it or it stands alone, so coin amounts like "0.001 BTC" or "1 ETC" are left unscaled
+DISPLAY_VALUE = re.compile(r'([-+]?(?:\d[\d,]*)?\.?\d+)\s*([kKMGBTPEZ](?=[Hh]/|[Hh]\b|Sol\b|Sol/|/|(?![A-Za-z])))?')
+VALUE_MULTIPLIERS = {
+    "k": 1e3, "K": 1e3, "M": 1e6, "G": 1e9, "B": 1e9,
+    "T": 1e12, "P": 1e15, "E": 1e18, "Z": 1e21,
+}
+VECTORIZE_MIN_ROWS = 500      # Smaller batches are parsed faster without pandas
+NUMERIC_VERSION = 2           # Bumped when parse_value changes, stored numbers are parsed again
+
+# Pulls a whole table in one WebDriver call: (row class, [cell text]) for every body row.
+# arguments: table id, cell text property ("innerText" or "textContent")
+TABLE_SCRIPT = """
+const table = document.getElementById(arguments[0]);
+const tbody = table && table.querySelector("tbody");
+if (!tbody) return [];
+return Array.from(tbody.querySelectorAll("tr"), row => [
+    row.getAttribute("class") || "",
+    Array.from(row.querySelectorAll("td"), cell => cell[arguments[1]] || "")
+]);
+"""
 
 # SCRAPING FUNCTIONS
 def clean_rank(rank_text):
@@ -50,14 +155,10 @@ def clean_rank(rank_text):
 def clean_coin(coin_text):
     cleaned = ' '.join(coin_text.strip().splitlines())
     # Remove extra spaces
-    return re.sub(r'\s+', ' ', cleaned).strip()
+    return WHITESPACE.sub(' ', cleaned).strip()
 
-def get_text(cell):
-    try:
-        text = cell.text.strip() or cell.get_attribute("innerText").strip()
-        return text.replace('\n', ' ')
-    except:
-        return ""
+def get_text(text):
+    return (text or "").strip().replace('\n', ' ')
 
 def clean_pool_text(text):
     if not text:
@@ -66,7 +167,7 @@ def clean_pool_text(text):
 
 # Removes ticker
 def extract_base_coin_name(coin_with_ticker):
-    match = re.search(r'([A-Z]{2,})$', coin_with_ticker)
+    match = COIN_TICKER.search(coin_with_ticker)
     if match:
         ticker_length = len(match.group(1))
         return coin_with_ticker[:-ticker_length]
@@ -93,17 +194,12 @@ def process_coin_name(coin_display_name):
     return coin_url_name
 
 def extract_country_and_pool(text):
-    multi_word_countries = [
-        "United States", "United Kingdom", "North Korea", "South Korea", 
-        "New Zealand", "Costa Rica", "Puerto Rico", "Saudi Arabia", 
-        "Czech Republic", "South Africa", "Hong Kong"
-    ]
-    
-    for country in multi_word_countries:
+    parts = text.split(maxsplit=1)
+
+    for country in MULTI_WORD_COUNTRIES.get(parts[0] if parts else "", []):
         if text.startswith(country):
             return country, text[len(country):].strip()
-    
-    parts = text.split(maxsplit=1)
+
     return (parts[0], parts[1]) if len(parts) > 1 else ("Unknown", text)
 
 def clean_pool_name(pool_name):
@@ -120,29 +216,20 @@ def clean_blocks_data(blocks_text):
     
     return re.sub(r'(\d+)([-+])', r'\1 \2', blocks_text)
 
-def scrape_top_coins(driver):
-    print("Getting top coins")
-    url = "https://miningpoolstats.stream/"
-    driver.get(url)
-    
-    # Wait for table to load
-    WebDriverWait(driver, 60).until(
-        EC.presence_of_element_located((By.ID, "coins"))
-    )
-    time.sleep(3)  # Let page load
-    table = driver.find_element(By.ID, "coins")
-    tbody = table.find_element(By.TAG_NAME, "tbody")
-    rows = tbody.find_elements(By.TAG_NAME, "tr")
-    
-    print(f"Found {len(rows)} rows")
+# Every body row of a table as (row class, [cell text]), in a single round trip to the browser
+def extract_table(driver, table_id, text_property="textContent"):
+    rows = driver.execute_script(TABLE_SCRIPT, table_id, text_property)
+    return [(row_class, cells) for row_class, cells in rows]
+
+# Top coin rows from the extracted coins table
+def parse_top_coins(rows, limit=20):
     data = []
-    
-    for i, row in enumerate(rows[:20]):  # Get top 20 coins
-        cells = row.find_elements(By.TAG_NAME, "td")
+
+    for i, (row_class, cells) in enumerate(rows[:limit]):
         if len(cells) < 13:
             print(f"Row {i+1} has only {len(cells)} fields, skipping")
             continue
-            
+
         try:
             # Getting data
             rank = clean_rank(get_text(cells[0]))
@@ -157,118 +244,481 @@ def scrape_top_coins(driver):
             pools_hashrate = get_text(cells[9])
             network_hashrate = get_text(cells[10])
             last_block = clean_pool_text(get_text(cells[12]))
-            
+
             data.append([
                 rank, coin, algo, market_cap, emission, price, change_7d,
                 volume, pools_known, pools_hashrate, network_hashrate, last_block
             ])
         except Exception as e:
             print(f"Error processing row {i+1}: {e}")
-    
-    # Save to CSV
-    top_coins_file = os.path.join(FINAL_OUTPUT_DIR, "Top20Coins.csv")
-    headers = [
-        "Rank", "Coin", "Algorithm", "MarketCap", "Emission(Last 24h)",
-        "Price(USD)", "7Day Price Change", "Volume(Last 24h)",
-        "Pools(known)", "PoolsHashrate", "NetworkHashrate", "LastBlock Found"
-    ]
-    
-    with open(top_coins_file, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(headers)
-        writer.writerows(data)
-    
-    print(f"Top coins saved to: {top_coins_file}")
+
     return data
 
-def scrape_coin_pools(driver, coin_data):
-    print("\nScraping pool data\n")
-    
-    for row in coin_data:
-        rank = row[0]
-        coin_display_name = row[1]
-        coin_url_name = process_coin_name(coin_display_name)
-        url = f"https://miningpoolstats.stream/{coin_url_name}"
-        
-        print(f"Scraping {coin_display_name}")
-        driver.get(url)
-        
+# Pool rows from the extracted pools table, ad rows skipped
+def parse_pool_rows(rows, limit=15):
+    coin_pools = []
+
+    for row_class, cells in rows:
+        # Skip ad rows
+        if "show1100" in row_class:
+            continue
+
+        if len(cells) < 3:
+            continue
+
+        row_data = []
+
+        # Get each cell
+        row_data.append(clean_pool_text(cells[0]).strip('.'))  # Rank
+
+        # Country and Pool
+        country, pool = extract_country_and_pool(clean_pool_text(cells[1]))
+        row_data.append(country)
+        row_data.append(clean_pool_name(pool))
+
+        # Other cells
+        for i in range(2, 11):
+            if len(cells) > i:
+                text = clean_pool_text(cells[i])
+                if i == 8:
+                    row_data.append(clean_blocks_data(text))
+                else:
+                    row_data.append(text if text else "No Data")
+            else:
+                row_data.append("No Data")
+
+        if any(row_data):
+            coin_pools.append(row_data)
+
+        # Limit to top 15 pools per coin
+        if len(coin_pools) >= limit:
+            break
+
+    return coin_pools
+
+# Spaces out page loads on the same domain, shared by every browser session.
+# Each caller reserves the next free slot, so sessions never hit the site at once
+class DomainRateLimiter:
+    def __init__(self, interval=DOMAIN_DELAY):
+        self.interval = interval
+        self.next_slot = {}
+        self.lock = threading.Lock()
+
+    def wait(self, url):
+        domain = urlparse(url).netloc
+
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(domain, now))
+            self.next_slot[domain] = slot + self.interval
+
+        time.sleep(slot - now)
+
+# Raised by a backend that could not get a table, the fallback backend takes over on it
+class FetchError(Exception):
+    pass
+
+# The page came back but its table is empty, it is filled in by scripts the HTTP backend cannot run
+class ScriptedTableError(FetchError):
+    pass
+
+# Reads one table out of an HTML page into the same (row class, [cell text]) rows as TABLE_SCRIPT.
+# innerText mode turns <br> and block tags into line breaks and collapses whitespace like a browser does
+class TableParser(HTMLParser):
+    BLOCK_TAGS = {"br", "div", "p", "li", "tr"}
+
+    def __init__(self, table_id, text_property="textContent"):
+        super().__init__(convert_charrefs=True)
+        self.table_id = table_id
+        self.inner_text = text_property == "innerText"
+        self.depth = 0          # Table nesting inside the wanted table, 0 is outside it
+        self.found = False
+        self.in_tbody = False
+        self.done = False
+        self.skip = 0           # Inside <script> or <style>
+        self.rows = []
+        self.cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+
+        if tag in ("script", "style"):
+            self.skip += 1
+            return
+
+        if not self.depth:
+            if tag == "table" and dict(attrs).get("id") == self.table_id:
+                self.depth = 1
+                self.found = True
+            return
+
+        if tag == "table":
+            self.depth += 1
+        elif tag == "tbody" and not self.in_tbody:
+            self.in_tbody = True
+        elif not self.in_tbody:
+            return
+        elif tag == "tr":
+            self.rows.append((dict(attrs).get("class") or "", []))
+            self.cell = None
+        elif tag == "td" and self.rows:
+            self.cell = []
+            self.rows[-1][1].append(self.cell)
+        elif self.cell is not None and self.inner_text and tag in self.BLOCK_TAGS:
+            self.cell.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style") and self.skip:
+            self.skip -= 1
+        elif not self.depth or self.done:
+            return
+        elif tag == "table":
+            self.depth -= 1
+            self.done = not self.depth
+        elif tag == "tbody" and self.depth == 1:
+            # Only the first tbody, like querySelector("tbody")
+            self.done = True
+        elif tag == "td":
+            self.cell = None
+
+    def handle_data(self, data):
+        if self.cell is None or self.skip:
+            return
+
+        if self.inner_text:
+            data = re.sub(r"\s+", " ", data)
+        self.cell.append(data)
+
+    # Rows with the cell text joined, None when the page has no such table
+    def table(self):
+        if not self.found or not self.in_tbody:
+            return None
+
+        rows = []
+        for row_class, cells in self.rows:
+            texts = ["".join(cell) for cell in cells]
+            if self.inner_text:
+                texts = ["\n".join(line.strip() for line in text.split("\n")).strip() for text in texts]
+            rows.append((row_class, texts))
+        return rows
+
+def parse_table(html, table_id, text_property="textContent"):
+    parser = TableParser(table_id, text_property)
+    parser.feed(html)
+    parser.close()
+    return parser.table()
+
+# Backends hand out tables as (row class, [cell text]) rows for a site path ("/" or "/<coin>").
+# workers is how many pages they can fetch at once, check() runs between daemon runs and
+# replaces whatever went bad, close() frees what they hold
+
+# Fetches pages over HTTP with a pooled keep-alive client, no browser needed.
+# Pages where the table is filled in by scripts raise FetchError so the fallback can render them
+class HttpBackend:
+    def __init__(self, base_url=SITE_URL, limiter=None, workers=HTTP_WORKERS):
+        if urllib3 is None:
+            raise RuntimeError("The http backend needs urllib3 (pip install urllib3)")
+
+        self.base_url = base_url.rstrip("/")
+        self.limiter = limiter or DomainRateLimiter()
+        self.workers = workers
+        self.http = urllib3.PoolManager(
+            maxsize=workers,
+            block=True,
+            headers={"User-Agent": USER_AGENT, "Accept-Encoding": "gzip, deflate"},
+            retries=urllib3.Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504]),
+            timeout=urllib3.Timeout(total=HTTP_TIMEOUT),
+        )
+
+    def table(self, path, table_id, text_property="textContent"):
+        url = self.base_url + path
+        self.limiter.wait(url)
+
+        try:
+            response = self.http.request("GET", url)
+        except urllib3.exceptions.HTTPError as e:
+            raise FetchError(f"{url}: {e}")
+
+        if response.status != 200:
+            raise FetchError(f"{url}: HTTP {response.status}")
+
+        rows = parse_table(response.data.decode("utf-8", errors="replace"), table_id, text_property)
+        if not rows:
+            raise ScriptedTableError(f"{url}: no rows in #{table_id}")
+        return rows
+
+    def close(self):
+        self.http.clear()
+
+    def check(self):
+        pass
+
+# Reads recorded pages from a directory, index.html for "/" and <coin>.html for "/<coin>"
+class FixtureBackend:
+    def __init__(self, directory=FIXTURE_DIR):
+        self.directory = directory
+        self.workers = HTTP_WORKERS
+
+    def table(self, path, table_id, text_property="textContent"):
+        name = path.strip("/") or "index"
+        file_path = os.path.join(self.directory, f"{name}.html")
+
+        try:
+            with open(file_path, encoding="utf-8") as f:
+                rows = parse_table(f.read(), table_id, text_property)
+        except OSError as e:
+            raise FetchError(f"{file_path}: {e}")
+
+        if rows is None:
+            raise FetchError(f"{file_path}: no #{table_id} table")
+        return rows
+
+    def check(self):
+        pass
+
+    def close(self):
+        pass
+
+# Renders pages in a pool of Firefox sessions. The virtual display and the sessions
+# are only started on the first page, so a fallback that is never needed costs nothing
+class SeleniumBackend:
+    def __init__(self, base_url=SITE_URL, limiter=None, sessions=DRIVER_POOL_SIZE):
+        self.base_url = base_url.rstrip("/")
+        self.limiter = limiter or DomainRateLimiter()
+        self.workers = sessions
+        self.display = None
+        self.drivers = []
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.display:
+                return
+
+            if webdriver is None:
+                raise RuntimeError("The selenium backend needs selenium and pyvirtualdisplay")
+
+            # Start headless display
+            self.display = Display(visible=0, size=(1920, 1080))
+            self.display.start()
+
+            self.drivers = setup_drivers(self.workers)
+            for driver in self.drivers:
+                self.idle.put(driver)
+
+    def table(self, path, table_id, text_property="textContent"):
+        self.start()
+
+        url = self.base_url + path
+        driver = self.next_session()
+
         try:
+            self.limiter.wait(url)  # For bot detection
+            driver.get(url)
+
+            # Wait for table to load
             WebDriverWait(driver, 60).until(
-                EC.presence_of_element_located((By.ID, "pools"))
+                EC.presence_of_element_located((By.ID, table_id))
             )
             time.sleep(3)  # Let page load
-            
-            pools_table = driver.find_element(By.ID, "pools")
-            tbody = pools_table.find_element(By.TAG_NAME, "tbody")
-            rows = tbody.find_elements(By.TAG_NAME, "tr")
-            
-            headers = [
-                "Rank", "Country", "Pool", "PoolFee", 
-                "Daily PPS $ / 100 TH", "MinPay", "Miners", 
-                "Hashrate", "Network %", "Blocks and Expected Block Diff", 
-                "BlockHeight", "LastFound"
-            ]
-            
-            coin_pools = []
-            count = 0
-            
-            for row in rows:
-                # Skip ad rows
-                if "show1100" in row.get_attribute("class"):
-                    continue
-                    
-                cells = row.find_elements(By.TAG_NAME, "td")
-                if len(cells) < 3:
-                    continue
-                    
-                row_data = []
-                
-                # Get each cell
-                row_data.append(clean_pool_text(cells[0].get_attribute("textContent")).strip('.'))  # Rank
-                
-                # Country and Pool
-                country_pool_text = clean_pool_text(cells[1].get_attribute("textContent"))
-                country, pool = extract_country_and_pool(country_pool_text)
-                row_data.append(country)
-                row_data.append(clean_pool_name(pool))
-                
-                # Other cells
-                for i in range(2, 11):
-                    if len(cells) > i:
-                        text = clean_pool_text(cells[i].get_attribute("textContent"))
-                        if i == 8:
-                            row_data.append(clean_blocks_data(text))
-                        else:
-                            row_data.append(text if text else "No Data")
-                    else:
-                        row_data.append("No Data")
-                
-                if any(row_data):
-                    coin_pools.append(row_data)
-                    count += 1
-                
-                # Limit to top 15 pools per coin
-                if count >= 15:
-                    break
-            
-            # Save raw data
-            safe_name = re.sub(r'[^\w\-]', '_', coin_url_name)
-            coin_file = os.path.join(RAW_POOLS_DIR, f"{safe_name}_pools.csv")
-            
-            with open(coin_file, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(headers)
-                writer.writerows(coin_pools)
-            
-            print(f"  Retrieved {len(coin_pools)} pools")
-            time.sleep(2)  # For bot detection
-            
-        except Exception as e:
-            print(f"Error scraping {coin_display_name}: {e}")
-            traceback.print_exc()
-    
-    print("All raw pool data saved")
+
+            return extract_table(driver, table_id, text_property)
+        except Exception:
+            # A slow page is the site's fault, a session that stopped answering is replaced
+            if not driver_alive(driver):
+                driver = self.recycle(driver, "not responding")
+            raise
+        finally:
+            if driver:
+                self.idle.put(driver)
+
+    # Waits up to SESSION_WAIT for a free session, gives up at once when none are left
+    def next_session(self):
+        deadline = time.monotonic() + SESSION_WAIT
+        while self.drivers and time.monotonic() < deadline:
+            try:
+                return self.idle.get(timeout=1)
+            except queue.Empty:
+                pass
+        raise RuntimeError("No Firefox session left to load the page")
+
+    # Replaces a session with a fresh one on the same Marionette port, None when that fails
+    def recycle(self, driver, reason):
+        print(f"  Restarting the Firefox session on port {driver.marionette_port}: {reason}")
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+        with self.lock:
+            self.drivers.remove(driver)
+        try:
+            fresh = setup_driver(driver.marionette_port)
+        except RuntimeError:
+            return None
+
+        with self.lock:
+            self.drivers.append(fresh)
+        return fresh
+
+    # Between runs, when every session is idle: sessions that stopped answering or grew past
+    # DRIVER_MAX_RSS_MB are restarted, sessions lost earlier are started again on their ports
+    # and everything is restarted when the display went away
+    def check(self):
+        if not self.display:
+            return
+
+        if not getattr(self.display, "is_alive", lambda: True)():
+            print("Virtual display died, restarting the browser")
+            self.close()
+            self.start()
+            return
+
+        for driver in list(self.drivers):
+            if not driver_alive(driver):
+                self.recycle(driver, "not responding")
+                continue
+
+            rss = process_tree_rss(driver.capabilities.get("moz:processID"))
+            if rss is not None and rss > DRIVER_MAX_RSS_MB:
+                self.recycle(driver, f"using {rss:.0f} MB")
+
+        used = {driver.marionette_port for driver in self.drivers}
+        for port in range(MARIONETTE_BASE_PORT, MARIONETTE_BASE_PORT + self.workers):
+            if port not in used:
+                try:
+                    self.drivers.append(setup_driver(port))
+                except RuntimeError:
+                    pass
+
+        if not self.drivers:
+            print("No Firefox session left, restarting the browser")
+            self.close()
+            self.start()
+            return
+
+        self.idle = queue.Queue()
+        for driver in self.drivers:
+            self.idle.put(driver)
+
+    def close(self):
+        # Cleanup
+        for driver in self.drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        if self.display:
+            self.display.stop()
+
+        self.drivers = []
+        self.display = None
+        self.idle = queue.Queue()
+
+# Tries the primary backend and renders the page with the fallback when it fails
+# Once a page turns out to be filled in by scripts the primary is skipped for the rest of the run,
+# the other pages are built the same way and would only cost a wasted request each
+class FallbackBackend:
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+        self.use_primary = True
+
+    @property
+    def workers(self):
+        return self.primary.workers if self.use_primary else self.fallback.workers
+
+    def table(self, path, table_id, text_property="textContent"):
+        if not self.use_primary:
+            return self.fallback.table(path, table_id, text_property)
+
+        try:
+            return self.primary.table(path, table_id, text_property)
+        except ScriptedTableError as e:
+            print(f"  {e}, using the browser for the rest of the run")
+            self.use_primary = False
+        except FetchError as e:
+            print(f"  {e}, falling back to the browser")
+        return self.fallback.table(path, table_id, text_property)
+
+    # Between runs, the next run tries the primary again in case the site changed
+    def check(self):
+        self.primary.check()
+        self.fallback.check()
+        self.use_primary = True
+
+    def close(self):
+        self.primary.close()
+        self.fallback.close()
+
+# Builds the backend picked by name, the http backend falls back to selenium when it cannot be used.
+# Only stand-in servers serve the tables over plain HTTP, the live site needs selenium
+def make_backend(name=BACKEND, base_url=SITE_URL, fixture_dir=FIXTURE_DIR):
+    limiter = DomainRateLimiter()
+
+    if name == "fixtures":
+        return FixtureBackend(fixture_dir)
+    if name == "selenium":
+        return SeleniumBackend(base_url, limiter)
+
+    try:
+        return FallbackBackend(HttpBackend(base_url, limiter), SeleniumBackend(base_url, limiter))
+    except RuntimeError as e:
+        print(f"{e}, using the selenium backend")
+        return SeleniumBackend(base_url, limiter)
+
+def scrape_top_coins(backend):
+    print("Getting top coins")
+
+    # Visible text, like the old per cell .text
+    rows = backend.table("/", "coins", "innerText")
+
+    print(f"Found {len(rows)} rows")
+    return parse_top_coins(rows)  # Get top 20 coins
+
+# Scrapes one coin's pool table, returns (coin, file name, raw pool rows) or None when the page failed.
+# raw_dir keeps a copy of the raw rows for debugging
+def scrape_coin_page(backend, row, raw_dir=None):
+    coin_display_name = row[1]
+    coin_url_name = process_coin_name(coin_display_name)
+
+    print(f"Scraping {coin_display_name}")
+
+    try:
+        coin_pools = parse_pool_rows(backend.table(f"/{coin_url_name}", "pools"))
+        safe_name = re.sub(r'[^\w\-]', '_', coin_url_name)
+        file_name = f"{safe_name}_pools.csv"
+
+        # Save raw data
+        if raw_dir:
+            os.makedirs(raw_dir, exist_ok=True)
+            with open(os.path.join(raw_dir, file_name), "w", newline="", encoding="utf-8") as f:
+                f.write(render_csv(RAW_POOL_HEADER, coin_pools))
+
+        print(f"  {coin_display_name}: retrieved {len(coin_pools)} pools")
+        return coin_url_name, file_name, coin_pools
+
+    except Exception as e:
+        print(f"Error scraping {coin_display_name}: {e}")
+        traceback.print_exc()
+        return None
+
+# Fans the coin pages out over the backend's workers (browser sessions or HTTP connections)
+# and yields (coin, file name, raw pool rows) for each coin as soon as its page is done
+def scrape_coin_pools(backend, coin_data, raw_dir=None):
+    print("\nScraping pool data\n")
+
+    with ThreadPoolExecutor(max_workers=backend.workers) as executor:
+        futures = [executor.submit(scrape_coin_page, backend, row, raw_dir) for row in coin_data]
+
+        for future in as_completed(futures):
+            result = future.result()
+            if result:
+                yield result
+
+    print("All pool data scraped")
 
 # Cleaning 
 def normalise_country(raw: str) -> str:
@@ -283,10 +733,21 @@ def normalise_country(raw: str) -> str:
 # Get the domain name from pool names
 def cleanup_pool(name: str) -> str:
     name = name.replace("Multi-Coin", "").strip().strip('"')
-    domain_pattern = re.compile(r'([a-zA-Z0-9-]+\.(?:com|io|net|org|info|biz|us|cn|uk|de))')
-    matches = domain_pattern.findall(name)
-    return matches[0] if matches else name
+    match = POOL_DOMAIN.search(name)
+    return match.group(1) if match else name
+
+# Raw pool rows in, KEEP_HEADER rows out, one at a time
+def clean_rows(rows: Iterable[List[str]]) -> Iterator[List[str]]:
+    for row in rows:
+        if len(row) < max(KEEP_INDEXES) + 1:
+            continue
 
+        cleaned = [row[i].strip() for i in KEEP_INDEXES]
+        cleaned[1] = normalise_country(cleaned[1])  # Country
+        cleaned[2] = cleanup_pool(cleaned[2])          # Pool name
+        yield cleaned
+
+# Cleans a raw dump written with --keep-raw
 def clean_single_file(in_path: str, out_path: str) -> None:
     with open(in_path, newline="", encoding="utf-8") as fin, \
          open(out_path, "w", newline="", encoding="utf-8") as fout:
@@ -294,33 +755,396 @@ def clean_single_file(in_path: str, out_path: str) -> None:
         reader, writer = csv.reader(fin), csv.writer(fout)
         next(reader, None)  # Skip header
         writer.writerow(KEEP_HEADER)
+        writer.writerows(clean_rows(reader))
+
+# The number in a displayed value times its suffix, "123.45 PH/s" is 1.2345e17 (H/s),
+# "$0.0123" is 0.0123 (USD). None when there is no number, as in "No Data"
+def parse_value(text: str) -> Optional[float]:
+    match = DISPLAY_VALUE.search(text or "")
+    if not match:
+        return None
+    return float(match.group(1).replace(",", "")) * VALUE_MULTIPLIERS.get(match.group(2), 1)
+
+# Percentages as fractions, "12.3%" is 0.123
+def parse_fraction(text: str) -> Optional[float]:
+    value = parse_value(text)
+    if value is not None and "%" in text:
+        value /= 100
+    return value
+
+PARSERS = {"value": parse_value, "fraction": parse_fraction}
+
+# Parses text columns into numeric ones in one batch. spec maps a numeric column to
+# (text column, "value" or "fraction"). Snapshots repeat the same few values a lot, so big
+# batches are factorized with pandas when it is installed and each distinct text is parsed once
+def parse_columns(columns: Dict[str, List[str]], spec: Dict[str, tuple]) -> Dict[str, List[Optional[float]]]:
+    numeric = {}
+    for name, (source, kind) in spec.items():
+        texts = columns[source]
+        parser = PARSERS[kind]
+
+        if pd is None or len(texts) < VECTORIZE_MIN_ROWS:
+            numeric[name] = [parser(text) for text in texts]
+            continue
+
+        codes, uniques = pd.factorize(pd.Series(texts, dtype=object).fillna(""))
+        parsed = np.array([parser(text) for text in uniques], dtype=object)
+        numeric[name] = parsed[codes].tolist()
+
+    return numeric
+
+def render_csv(header, rows) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+# Writes through a temp file in the same dir, readers only ever see a whole file
+def write_atomic(path, data: bytes) -> None:
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+# Publishes CSVs to their local output dir and the web dir. Each file is content hashed and
+# files that have not changed since the last run are left alone, the hashes are kept in
+# PUBLISH_MANIFEST between runs. Everything published this run is kept in memory for the zip
+class Publisher:
+    def __init__(self, web_dir=WEB_DIR, manifest_path=PUBLISH_MANIFEST):
+        self.web_dir = web_dir
+        self.manifest_path = manifest_path
+        self.files = {}
+        self.zip_name = None
+        self.zip_digest = None
+        self.results = {}
+        self.changed = 0
+
+        try:
+            with open(manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            self.files = manifest.get("files", {})
+            self.zip_name = manifest.get("zip")
+            self.zip_digest = manifest.get("zip_digest")
+        except (OSError, ValueError):
+            pass
+
+    # Forgets the last run's files, so a long running process zips only what this run published
+    def new_run(self):
+        self.results = {}
+        self.changed = 0
+
+    def publish(self, file_name, header, rows, local_dir) -> bool:
+        data = render_csv(header, rows).encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        self.results[file_name] = data
+
+        paths = [os.path.join(local_dir, file_name), os.path.join(self.web_dir, file_name)]
+        if self.files.get(file_name) == digest and all(os.path.exists(path) for path in paths):
+            return False
+
+        for path in paths:
+            write_atomic(path, data)
+
+        self.files[file_name] = digest
+        self.changed += 1
+        self.save()
+        return True
+
+    # Zip of everything published this run, deflated and built from memory. When nothing
+    # differs from the last run's zip that one is still current and is handed back instead
+    def archive(self, timestamp) -> str:
+        combined = hashlib.sha256()
+        for file_name in sorted(self.results):
+            combined.update(f"{file_name}\0{self.files[file_name]}\n".encode("utf-8"))
+        digest = combined.hexdigest()
+
+        if digest == self.zip_digest and self.zip_name and os.path.exists(os.path.join(self.web_dir, self.zip_name)):
+            print("Nothing changed, keeping the last zip")
+            return os.path.join(self.web_dir, self.zip_name)
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as zipf:
+            for file_name in sorted(self.results):
+                zipf.writestr(file_name, self.results[file_name])
 
-        for row in reader:
-            if len(row) < max(KEEP_INDEXES) + 1:
+        self.zip_name = f"mining_data_{timestamp}.zip"
+        self.zip_digest = digest
+        zip_path = os.path.join(self.web_dir, self.zip_name)
+        write_atomic(zip_path, buffer.getvalue())
+        self.save()
+        return zip_path
+
+    # Removes web dir files older than KEEP_DAYS, except the ones this run published (unchanged
+    # files keep their old mtime) and the zip that is still current
+    def prune(self):
+        cutoff = time.time() - KEEP_DAYS * 86400
+        current = set(self.results) | {self.zip_name}
+
+        for file_name in os.listdir(self.web_dir):
+            file_path = os.path.join(self.web_dir, file_name)
+            if file_name in current or not os.path.isfile(file_path):
                 continue
 
-            cleaned = [row[i].strip() for i in KEEP_INDEXES]
-            cleaned[1] = normalise_country(cleaned[1])  # Country
-            cleaned[2] = cleanup_pool(cleaned[2])          # Pool name
-            writer.writerow(cleaned)
+            if os.stat(file_path).st_mtime < cutoff:
+                os.remove(file_path)
+                self.files.pop(file_name, None)
 
-def clean_pool_data():
-    print("\nCleaning pool data\n")
-    cleaned_count = 0
-    
-    for fname in os.listdir(RAW_POOLS_DIR):
-        if fname.lower().endswith(".csv"):
-            in_path = os.path.join(RAW_POOLS_DIR, fname)
-            out_path = os.path.join(CLEANED_POOLS_DIR, fname)
-            clean_single_file(in_path, out_path)
-            cleaned_count += 1
-            print(f"  {fname} complete")
-    
-    print(f"Cleaned {cleaned_count} pools")
+        self.save()
+
+    def save(self):
+        manifest = {"files": self.files, "zip": self.zip_name, "zip_digest": self.zip_digest}
+        write_atomic(self.manifest_path, json.dumps(manifest, indent=2).encode("utf-8"))
+
+# Run history in SQLite. A row is stored once with the first and last run it was seen in,
+# runs that see it unchanged only move last_seen on, so the store grows with changes, not runs.
+# Times are unix seconds, coins are keyed by their URL name (see process_coin_name)
+HISTORY_SCHEMA = """
+PRAGMA journal_mode = WAL;
+CREATE TABLE IF NOT EXISTS coins (
+    coin TEXT NOT NULL, rank TEXT, name TEXT, algorithm TEXT, market_cap TEXT, emission TEXT,
+    price TEXT, change_7d TEXT, volume TEXT, pools_known TEXT, pools_hashrate TEXT,
+    network_hashrate TEXT, last_block TEXT,
+    first_seen INTEGER NOT NULL, last_seen INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS coins_by_time ON coins (coin, first_seen);
+CREATE TABLE IF NOT EXISTS pools (
+    coin TEXT NOT NULL, pool TEXT NOT NULL, country TEXT NOT NULL, rank TEXT, pps TEXT,
+    min_pay TEXT, miners TEXT, hashrate TEXT, hashrate_share TEXT,
+    first_seen INTEGER NOT NULL, last_seen INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pools_by_time ON pools (coin, pool, first_seen);
+"""
+
+# Columns in TOP_COINS_HEADER and KEEP_HEADER order
+COIN_COLUMNS = ["rank", "name", "algorithm", "market_cap", "emission", "price", "change_7d",
+                "volume", "pools_known", "pools_hashrate", "network_hashrate", "last_block"]
+POOL_COLUMNS = ["rank", "country", "pool", "pps", "min_pay", "miners", "hashrate", "hashrate_share"]
+
+# Numeric columns parsed from the text ones (see parse_columns), hashrates in H/s, money in USD
+COIN_NUMERIC = {
+    "market_cap_usd": ("market_cap", "value"),
+    "emission_usd": ("emission", "value"),
+    "price_usd": ("price", "value"),
+    "change_7d_fraction": ("change_7d", "fraction"),
+    "volume_usd": ("volume", "value"),
+    "pools_known_count": ("pools_known", "value"),
+    "pools_hashrate_hs": ("pools_hashrate", "value"),
+    "network_hashrate_hs": ("network_hashrate", "value"),
+}
+POOL_NUMERIC = {
+    "pps_usd": ("pps", "value"),
+    "min_pay_value": ("min_pay", "value"),
+    "miners_count": ("miners", "value"),
+    "hashrate_hs": ("hashrate", "value"),
+    "hashrate_fraction": ("hashrate_share", "fraction"),
+}
+
+class HistoryStore:
+    def __init__(self, path=HISTORY_DB):
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(HISTORY_SCHEMA)
+
+        # Stores made before the numeric columns, or parsed by an older parse_value,
+        # get the columns added and filled in again
+        stale = self.db.execute("PRAGMA user_version").fetchone()[0] < NUMERIC_VERSION
+        for table, spec in (("coins", COIN_NUMERIC), ("pools", POOL_NUMERIC)):
+            existing = {row["name"] for row in self.db.execute(f"PRAGMA table_info({table})")}
+            missing = [column for column in spec if column not in existing]
+            for column in missing:
+                self.db.execute(f"ALTER TABLE {table} ADD COLUMN {column} REAL")
+            if missing or stale:
+                self.backfill(table, spec)
+
+        if stale:
+            self.db.execute(f"PRAGMA user_version = {NUMERIC_VERSION}")
+
+    # Parses the numeric columns of every stored row in one batch
+    def backfill(self, table, spec):
+        sources = sorted({source for source, kind in spec.values()})
+        rows = self.db.execute(f"SELECT rowid, {', '.join(sources)} FROM {table}").fetchall()
+        if not rows:
+            return
+
+        columns = {source: [row[source] for row in rows] for source in sources}
+        numeric = parse_columns(columns, spec)
+        assignments = ", ".join(f"{column} = ?" for column in spec)
+
+        with self.db:
+            self.db.executemany(
+                f"UPDATE {table} SET {assignments} WHERE rowid = ?",
+                [[numeric[column][i] for column in spec] + [row["rowid"]] for i, row in enumerate(rows)]
+            )
+
+    # Stores one row, or moves last_seen on when the latest row for the key has the same values.
+    # parsed holds the numeric columns, they follow from values so they are not compared
+    def record(self, table, key, values, when, parsed=None):
+        where = " AND ".join(f"{column} = ?" for column in key)
+        latest = self.db.execute(
+            f"SELECT rowid, * FROM {table} WHERE {where} ORDER BY first_seen DESC LIMIT 1",
+            list(key.values())
+        ).fetchone()
+
+        if latest and all(latest[column] == value for column, value in values.items()):
+            self.db.execute(f"UPDATE {table} SET last_seen = ? WHERE rowid = ?", (when, latest["rowid"]))
+            return
+
+        row = {**key, **values, **(parsed or {}), "first_seen": when, "last_seen": when}
+        self.db.execute(
+            f"INSERT INTO {table} ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+            list(row.values())
+        )
+
+    def record_coins(self, top_coins_data, when):
+        columns = {column: [row[i] for row in top_coins_data] for i, column in enumerate(COIN_COLUMNS)}
+        numeric = parse_columns(columns, COIN_NUMERIC)
+
+        with self.db:
+            for i, row in enumerate(top_coins_data):
+                values = dict(zip(COIN_COLUMNS, row))
+                parsed = {column: numeric[column][i] for column in COIN_NUMERIC}
+                self.record("coins", {"coin": process_coin_name(row[1])}, values, when, parsed)
+
+    # Cleaned pool rows of one coin, a pool is told apart by its name and country
+    def record_pools(self, coin, rows, when):
+        columns = {column: [row[i] for row in rows] for i, column in enumerate(POOL_COLUMNS)}
+        numeric = parse_columns(columns, POOL_NUMERIC)
+
+        with self.db:
+            for i, row in enumerate(rows):
+                values = dict(zip(POOL_COLUMNS, row))
+                key = {"coin": coin, "pool": values.pop("pool"), "country": values.pop("country")}
+                parsed = {column: numeric[column][i] for column in POOL_NUMERIC}
+                self.record("pools", key, values, when, parsed)
+
+    # Rows seen at any point between start and end (unix seconds, either can be left open)
+    def history(self, table, filters, start=None, end=None):
+        clauses = [f"{column} = ?" for column in filters]
+        params = list(filters.values())
+
+        if start is not None:
+            clauses.append("last_seen >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("first_seen <= ?")
+            params.append(end)
+
+        where = " AND ".join(clauses) or "1"
+        rows = self.db.execute(f"SELECT * FROM {table} WHERE {where} ORDER BY first_seen", params)
+        return [dict(row) for row in rows]
+
+    def coin_history(self, coin, start=None, end=None):
+        return self.history("coins", {"coin": coin}, start, end)
+
+    # Every pool of a coin, or one pool, over a time range
+    def pool_history(self, coin, pool=None, start=None, end=None):
+        filters = {"coin": coin}
+        if pool is not None:
+            filters["pool"] = pool
+        return self.history("pools", filters, start, end)
+
+    # The pools of a coin as they stood at one point in time
+    def pools_at(self, coin, when):
+        return self.history("pools", {"coin": coin}, when, when)
+
+    def close(self):
+        self.db.close()
+
+# Cleaned pool rows of each coin, kept with the coin's summary fields from the top coins table
+# and when its page was loaded. Saved as JSON next to the publish manifest
+class CoinCache:
+    def __init__(self, path=COIN_CACHE, ttl=COIN_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.entries = {}
+
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    # (file name, cleaned rows) while the coin's summary is unchanged and the entry is fresh, else None
+    def get(self, coin, row):
+        entry = self.entries.get(coin)
+        if not entry:
+            return None
+        if entry["summary"] != coin_summary(row) or time.time() - entry["fetched"] > self.ttl:
+            return None
+        return entry["file"], entry["rows"]
+
+    def put(self, coin, row, file_name, rows):
+        self.entries[coin] = {
+            "summary": coin_summary(row),
+            "fetched": time.time(),
+            "file": file_name,
+            "rows": rows,
+        }
+
+    # Saves the entries of the given coins, coins that left the top list are dropped
+    def save(self, coins):
+        self.entries = {coin: entry for coin, entry in self.entries.items() if coin in coins}
+        write_atomic(self.path, json.dumps(self.entries).encode("utf-8"))
+
+# LastBlock Found reads like "4m ago 861234", the age moves every minute but only a new height is a new block
+def coin_summary(row):
+    return [BLOCK_AGE.sub("", row[i]) for i in COIN_SUMMARY_INDEXES]
+
+# Scrape, clean and publish as one stream. Each coin is cleaned and published
+# as soon as its page is in, nothing is read back from disk. history also gets every run's rows.
+# With a cache only coins whose summary changed or whose entry expired are loaded again
+def run_pipeline(backend, publisher, raw_dir=None, history=None, cache=None):
+    run_time = int(time.time())
+
+    top_coins_data = scrape_top_coins(backend)
+    if not top_coins_data:
+        return []
+
+    if publisher.publish("Top20Coins.csv", TOP_COINS_HEADER, top_coins_data, FINAL_OUTPUT_DIR):
+        print("Top coins published")
+    if history:
+        history.record_coins(top_coins_data, run_time)
+
+    def publish_pools(coin, file_name, cleaned):
+        if publisher.publish(file_name, KEEP_HEADER, cleaned, CLEANED_POOLS_DIR):
+            print(f"  {file_name} published")
+        else:
+            print(f"  {file_name} unchanged")
+
+        if history:
+            history.record_pools(coin, cleaned, run_time)
+
+    rows_by_coin = {process_coin_name(row[1]): row for row in top_coins_data}
+    stale = []
+    for coin, row in rows_by_coin.items():
+        cached = cache.get(coin, row) if cache else None
+        if cached:
+            publish_pools(coin, *cached)
+        else:
+            stale.append(row)
+
+    if cache:
+        print(f"\n{len(rows_by_coin) - len(stale)} coins unchanged, {len(stale)} to load")
+
+    for coin, file_name, pool_rows in scrape_coin_pools(backend, stale, raw_dir):
+        cleaned = list(clean_rows(pool_rows))
+        publish_pools(coin, file_name, cleaned)
+
+        if cache:
+            cache.put(coin, rows_by_coin[coin], file_name, cleaned)
+
+    if cache:
+        cache.save(rows_by_coin)
+
+    return top_coins_data
+
+# Setup Firefox headless, every session needs its own Marionette port
+def setup_driver(marionette_port=MARIONETTE_BASE_PORT):
+    print(f"Setting up Firefox driver on Marionette port {marionette_port}")
+    if webdriver is None:
+        raise RuntimeError("Failed to init Firefox driver, selenium is not installed")
 
-# Setup Firefox headless
-def setup_driver():
-    print("Setting up Firefox driver")
     try:
         options = webdriver.FirefoxOptions()
         options.add_argument("--headless")
@@ -332,11 +1156,12 @@ def setup_driver():
         
         service = FirefoxService(
             executable_path="/usr/local/bin/geckodriver",
-            service_args=["--marionette-port", "2828"]
+            service_args=["--marionette-port", str(marionette_port)]
         )
         
         driver = webdriver.Firefox(service=service, options=options)
         driver.set_window_size(1920, 1080)
+        driver.marionette_port = marionette_port  # So a restart can reuse the port
         print("Firefox driver init completed")
         return driver
     except Exception as e:
@@ -344,107 +1169,203 @@ def setup_driver():
         traceback.print_exc()
         raise RuntimeError("Failed to init Firefox driver")
 
-def cleanup_raw_data():
-    print("\nCleaning up raw data...")
-    if os.path.exists(RAW_POOLS_DIR):
-        shutil.rmtree(RAW_POOLS_DIR)
-    else:
-        print("Raw data directory not found")
+# One cheap round trip to the browser, False when the session is gone
+def driver_alive(driver):
+    try:
+        driver.current_url
+        return True
+    except Exception:
+        return False
+
+# Resident memory in MB of a process and all its children (Firefox runs its tabs in
+# child processes), read from /proc. None when that is not available
+def process_tree_rss(pid):
+    if not pid or not os.path.isdir("/proc"):
+        return None
 
-# Uploads to server
-def publish_to_web():
-    print("\nUploading to web server...")
-    
-    # Clean old files (keep 7 days)
-    now = time.time()
-    for f in os.listdir(WEB_DIR):
-        file_path = os.path.join(WEB_DIR, f)
-        if os.path.isfile(file_path) and os.stat(file_path).st_mtime < now - 7 * 86400:
-            os.remove(file_path)
-    
-    # Copy Top20Coins.csv
-    top_coins = os.path.join(FINAL_OUTPUT_DIR, "Top20Coins.csv")
-    if os.path.exists(top_coins):
-        shutil.copy2(top_coins, WEB_DIR)
-    
-    # Copy cleaned pools
-    for fname in os.listdir(CLEANED_POOLS_DIR):
-        if fname.endswith(".csv"):
-            src = os.path.join(CLEANED_POOLS_DIR, fname)
-            shutil.copy2(src, WEB_DIR)
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                parent = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(parent, []).append(int(entry))
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    total = 0
+    pending = [int(pid)]
+    while pending:
+        current = pending.pop()
+        pending.extend(children.get(current, []))
+        try:
+            with open(f"/proc/{current}/statm") as f:
+                total += int(f.read().split()[1]) * page_size
+        except (OSError, ValueError, IndexError):
+            pass
+
+    return total / 2**20
+
+# Starts a pool of Firefox sessions side by side. Sessions that fail to start are
+# left out, it only gives up when none of them start
+def setup_drivers(count=DRIVER_POOL_SIZE):
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        futures = [executor.submit(setup_driver, MARIONETTE_BASE_PORT + i) for i in range(count)]
+
+    drivers = []
+    for future in futures:
+        try:
+            drivers.append(future.result())
+        except RuntimeError:
+            pass
+
+    if not drivers:
+        raise RuntimeError("Failed to init any Firefox driver")
+
+    print(f"{len(drivers)} of {count} Firefox sessions ready")
+    return drivers
+
+# Zips up what is published and prunes the web dir, the CSVs themselves are published as they finish
+def publish_to_web(publisher):
+    print(f"\nPublishing zip to web server ({publisher.changed} of {len(publisher.results)} files changed)...")
     
     # Create timestamped zip 
     est = pytz.timezone('US/Eastern')
     now_est = datetime.now(est)
     timestamp = now_est.strftime("%Y%m%d-%H_%M")
 
-    zip_path = os.path.join(WEB_DIR, f"mining_data_{timestamp}.zip")
-    
-    with zipfile.ZipFile(zip_path, 'w') as zipf:
-        for fname in os.listdir(WEB_DIR):
-            if fname.endswith(".csv"):
-                file_path = os.path.join(WEB_DIR, fname)
-                zipf.write(file_path, os.path.basename(file_path))
+    zip_path = publisher.archive(timestamp)
+
+    # Clean old files (keep 7 days)
+    publisher.prune()
     
     return zip_path
 
+# Create all dirs, at run time so importing this module (benchmark.py) leaves the disk alone
+def ensure_dirs():
+    os.makedirs(FINAL_OUTPUT_DIR, exist_ok=True)
+    os.makedirs(CLEANED_POOLS_DIR, exist_ok=True)
+    os.makedirs(WEB_DIR, exist_ok=True)
+
 def get_ip_address():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     s.connect(("8.8.8.8", 80))
     return s.getsockname()[0]
 
 
-def main():
-    # Start headless display
-    display = Display(visible=0, size=(1920, 1080))
-    display.start()
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrapes the top coins and their mining pools")
+    parser.add_argument("--backend", choices=["http", "selenium", "fixtures"], default=BACKEND,
+                        help="selenium renders pages in the browser (needed for the live site), http fetches them "
+                             "directly from a stand-in server and falls back to the browser")
+    parser.add_argument("--base-url", default=SITE_URL, help="site to scrape, e.g. a local stand-in server")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR, help="recorded pages for the fixtures backend")
+    parser.add_argument("--keep-raw", action="store_true", help=f"also dump the raw pool rows to {RAW_POOLS_DIR}")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and scrape on a schedule, with the browser kept warm between runs")
+    parser.add_argument("--interval", type=float, default=DAEMON_INTERVAL,
+                        help="seconds between daemon runs, moved by up to DAEMON_JITTER either way")
+    parser.add_argument("--refresh-all", action="store_true",
+                        help="load every coin's pool page, not only the ones whose summary changed")
+    return parser.parse_args()
 
+# One scrape and publish, returns False when no coins were found
+def run_once(backend, publisher, history, raw_dir=None, cache=None):
     start_time = time.time()
-    driver = None
-    
+    publisher.new_run()
+
+    # Scrape, clean and publish every coin as it comes in
+    top_coins_data = run_pipeline(backend, publisher, raw_dir, history, cache)
+
+    if not top_coins_data:
+        print("No coins found")
+        return False
+
+    # Publish the zip to web srv
+    zip_path = publish_to_web(publisher)
+    ip_address = get_ip_address()
+
+    # Time sats
+    end_time = time.time()
+    duration = end_time - start_time
+    minutes = int(duration // 60)
+    seconds = int(duration % 60)
+
+    # Final output
+    print("\n" + "="*50)
+    print(f"Completed in {minutes}m {seconds}s")
+    print("\nFind the files at:")
+    print(f"\n  http://{ip_address}/mining_data/")
+    print("\nFiles:")
+    print(f"  - Top20Coins.csv")
+    print(f"  - [coin_name]_pools.csv (for each coin)")
+    print(f"\nDownload all files as zip:")
+    print(f"  http://{ip_address}/mining_data/{os.path.basename(zip_path)}")
+    print("="*50)
+    return True
+
+# Runs every interval seconds until SIGTERM or Ctrl-C, which let the current run finish.
+# The backend stays up between runs, so a run only pays for the page loads. A failed run
+# is logged and the next one goes ahead, sessions are health checked in between
+def run_daemon(backend, publisher, history, raw_dir=None, cache=None, interval=DAEMON_INTERVAL):
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        print("\nStopping after this run")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    if isinstance(backend, SeleniumBackend):
+        backend.start()  # Start the browser up front, not in the first run
+
+    while not stop.is_set():
+        run_start = time.monotonic()
+        try:
+            run_once(backend, publisher, history, raw_dir, cache)
+        except Exception as e:
+            print(f"\nRun failed: {e}")
+            traceback.print_exc()
+
+        # After every run, a failed one most of all, so dead sessions are replaced before the next
+        try:
+            backend.check()
+        except Exception as e:
+            print(f"Session check failed: {e}")
+            traceback.print_exc()
+
+        wait = interval * (1 + random.uniform(-DAEMON_JITTER, DAEMON_JITTER)) - (time.monotonic() - run_start)
+        wait = max(wait, 0)
+        if not stop.is_set():
+            print(f"Next run in {wait:.0f}s")
+        stop.wait(wait)
+
+def main():
+    args = parse_args()
+    ensure_dirs()
+
+    backend = make_backend(args.backend, args.base_url, args.fixtures)
+    publisher = Publisher()
+    history = HistoryStore()
+    raw_dir = RAW_POOLS_DIR if args.keep_raw else None
+    cache = CoinCache(ttl=0 if args.refresh_all else COIN_CACHE_TTL)
+
     try:
-        # Setup and start scraping
-        driver = setup_driver()
-        top_coins_data = scrape_top_coins(driver)
-        
-        if not top_coins_data:
-            print("No coins found, exiting")
-            return
-        
-        scrape_coin_pools(driver, top_coins_data)
-        clean_pool_data()
-        cleanup_raw_data()
-        
-        # Publish to web srv
-        zip_path = publish_to_web()
-        ip_address = get_ip_address()
-        
-        # Time sats
-        end_time = time.time()
-        duration = end_time - start_time
-        minutes = int(duration // 60)
-        seconds = int(duration % 60)
-        
-        # Final output
-        print("\n" + "="*50)
-        print(f"Completed in {minutes}m {seconds}s")
-        print("\nFind the files at:")
-        print(f"\n  http://{ip_address}/mining_data/")
-        print("\nFiles:")
-        print(f"  - Top20Coins.csv")
-        print(f"  - [coin_name]_pools.csv (for each coin)")
-        print(f"\nDownload all files as zip:")
-        print(f"  http://{ip_address}/mining_data/{os.path.basename(zip_path)}")
-        print("="*50)
-        
+        if args.daemon:
+            run_daemon(backend, publisher, history, raw_dir, cache, args.interval)
+        else:
+            run_once(backend, publisher, history, raw_dir, cache)
+
     except Exception as e:
         print(f"\nScript failed: {e}")
         traceback.print_exc()
     finally:
         # Cleanup 
-        if driver:
-            driver.quit()
-        display.stop()
+        backend.close()
+        history.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,223 @@
+# Loopback benchmark for the port scanner engines
+#
+# Starts stand-in services on 127.0.0.1 in a separate process, scans the port block
+# with each engine and reports ports per second, per port latency and accuracy.
+# Everything stays on the local machine.
+#
+# Usage: python benchmark.py [--engines async,thread,shard] [--output results.json]
+
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import main
+
+
+# Stand-in service mix, spread at random over the port block
+BLOCK_START = 40000
+BLOCK_SIZE = 5000
+BANNER_PORTS = 100          # Send a banner as soon as they accept
+SLOW_BANNER_PORTS = 50      # Send a banner after SLOW_BANNER_DELAY
+SILENT_PORTS = 50           # Accept and never send anything
+SLOW_BANNER_DELAY = 0.3
+SEED = 1
+
+
+# Picks which ports in the block get which kind of listener
+def planListeners(blockStart, blockSize, seed):
+    ports = random.Random(seed).sample(range(blockStart, blockStart + blockSize),
+                                       BANNER_PORTS + SLOW_BANNER_PORTS + SILENT_PORTS)
+
+    plan = {}
+    for port in ports[:BANNER_PORTS]:
+        plan[port] = ("banner", 0)
+    for port in ports[BANNER_PORTS:BANNER_PORTS + SLOW_BANNER_PORTS]:
+        plan[port] = ("banner", SLOW_BANNER_DELAY)
+    for port in ports[BANNER_PORTS + SLOW_BANNER_PORTS:]:
+        plan[port] = ("silent", 0)
+
+    return plan
+
+
+# Runs in the listener process so the services do not share a GIL with the scanner.
+# Sends back the ports it managed to bind, then serves until told to stop
+def serveListeners(plan, conn):
+    async def serve():
+        servers = []
+        bound = []
+
+        for port, (kind, delay) in plan.items():
+            async def handle(reader, writer, port=port, kind=kind, delay=delay):
+                try:
+                    if kind == "banner":
+                        await asyncio.sleep(delay)
+                        writer.write(f"BENCH-{port}\r\n".encode())
+                        await writer.drain()
+
+                    # Hold the connection open like a real service would
+                    await reader.read(1024)
+                except OSError:
+                    pass
+                finally:
+                    writer.close()
+
+            try:
+                servers.append(await asyncio.start_server(handle, "127.0.0.1", port, backlog=512))
+                bound.append(port)
+            except OSError:
+                pass
+
+        conn.send(bound)
+
+        # Stop when the parent says so (or goes away)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, conn.recv)
+
+        for server in servers:
+            server.close()
+
+    try:
+        asyncio.run(serve())
+    except EOFError:
+        pass
+
+
+# Nearest rank percentile
+def percentile(values, fraction):
+    if not values:
+        return None
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+# Scans the block once with one engine and scores the results against the plan
+def runEngine(engine, plan, bound, blockStart, blockSize):
+    with tempfile.TemporaryDirectory() as tempDir:
+        exportPath = os.path.join(tempDir, "results.jsonl")
+
+        # The console output would only slow the scan down
+        start = time.perf_counter()
+        main.scanPorts(["127.0.0.1"], range(blockStart, blockStart + blockSize), engine=engine,
+                       exportPaths=[exportPath], discovery=False, order="sequential", console=False)
+        elapsed = time.perf_counter() - start
+
+        with open(exportPath, encoding="utf-8") as f:
+            results = [json.loads(line) for line in f]
+
+    expectedOpen = set(bound)
+    expectedBanners = {port for port in bound if plan[port][0] == "banner"}
+
+    found = {result["port"]: result for result in results}
+    foundOpen = {port for port, result in found.items() if result["state"] == "open"}
+    foundBanners = {port for port in foundOpen if found[port]["banner"] == f"BENCH-{port}"}
+
+    # Ports that could not be bound by the listener process are left out of the score
+    unknown = set(plan) - expectedOpen
+    scored = blockSize - len(unknown)
+    wrong = len((foundOpen ^ expectedOpen) - unknown)
+
+    latencies = [result["rtt"] for result in results if result["rtt"] is not None]
+
+    return {
+        "engine": engine,
+        "ports": blockSize,
+        "elapsed_s": round(elapsed, 4),
+        "ports_per_second": round(blockSize / elapsed, 1),
+        "latency_p50_ms": round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        "results": len(results),
+        "open_expected": len(expectedOpen),
+        "open_found": len(foundOpen & expectedOpen),
+        "false_positives": len(foundOpen - expectedOpen - unknown),
+        "false_negatives": len(expectedOpen - foundOpen),
+        "banners_expected": len(expectedBanners),
+        "banners_found": len(foundBanners),
+        "accuracy": round((scored - wrong) / scored, 6) if scored else None,
+    }
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser(description="Loopback benchmark for the port scanner engines")
+    parser.add_argument("--engines", default="async,thread,shard", help="comma separated engines to run")
+    parser.add_argument("--block-start", type=int, default=BLOCK_START, help="first port of the scanned block")
+    parser.add_argument("--block-size", type=int, default=BLOCK_SIZE, help="number of ports in the block")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per engine")
+    parser.add_argument("--seed", type=int, default=SEED, help="seed for placing the listeners")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    return parser.parse_args()
+
+
+def runBenchmark():
+    args = parseArgs()
+    engines = [engine.strip() for engine in args.engines.split(",") if engine.strip()]
+
+    # Every port is needed for latency and accuracy, and a progress line would skew timing
+    main.REPORT_CLOSED = True
+    main.SHOW_PROGRESS = False
+
+    plan = planListeners(args.block_start, args.block_size, args.seed)
+
+    parentConn, childConn = multiprocessing.Pipe()
+    listeners = multiprocessing.Process(target=serveListeners, args=(plan, childConn), daemon=True)
+    listeners.start()
+
+    try:
+        bound = parentConn.recv()
+        print(f"[+] {len(bound)} of {len(plan)} listeners up on 127.0.0.1", file=sys.stderr)
+
+        runs = []
+        for engine in engines:
+            for _ in range(args.repeat):
+                run = runEngine(engine, plan, bound, args.block_start, args.block_size)
+                runs.append(run)
+
+                print(f"[+] {engine:<7} {run['ports_per_second']:>10} ports/s  "
+                      f"p50 {run['latency_p50_ms']} ms  p99 {run['latency_p99_ms']} ms  "
+                      f"accuracy {run['accuracy']}", file=sys.stderr)
+    finally:
+        parentConn.send("stop")
+        listeners.join(5)
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "settings": {
+            "max_concurrency": main.MAX_CONCURRENCY,
+            "thread_count": main.THREAD_COUNT,
+            "shard_processes": main.SHARD_PROCESSES,
+            "connect_timeout": main.CONNECT_TIMEOUT,
+            "banner_timeout": main.BANNER_TIMEOUT,
+        },
+        "listeners": {
+            "block_start": args.block_start,
+            "block_size": args.block_size,
+            "banner": BANNER_PORTS,
+            "slow_banner": SLOW_BANNER_PORTS,
+            "slow_banner_delay_s": SLOW_BANNER_DELAY,
+            "silent": SILENT_PORTS,
+            "bound": len(bound),
+        },
+        "runs": runs,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    runBenchmark()
@@ -1,13 +1,109 @@
 # TO-DO:
-# Allow export to CSV
 # Make a prettier home screen 
 
 
+import argparse
+import asyncio
+import base64
+import bisect
+import collections
+import csv
+import errno
+import ipaddress
+import itertools
+import json
+import multiprocessing
+import os
 import socket
 import threading
 import queue
 import sys
-
+import time
+import zlib
+
+# Only there on Unix, without it the open file limit is left alone
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Scan engine settings
+SCAN_ENGINE = "async"     # "async" keeps many connects in flight, "thread" is the old worker pool,
+                          # "shard" spreads async engines over SHARD_PROCESSES processes
+MAX_CONCURRENCY = 1000    # Connects in flight at once for the async engine
+PER_HOST_CONCURRENCY = 1000  # Connects in flight against any one host, lower it to go easier on targets
+THREAD_COUNT = 100        # Worker threads for the thread engine
+SHARD_PROCESSES = os.cpu_count() or 1
+SHARD_SIZE = 4096         # (host, port) work items per shard handed to a process
+BANNER_CONCURRENCY = 256  # Open sockets waiting on a banner before connect workers have to wait
+STOP_POLL_INTERVAL = 0.2  # How often idle async workers check for a stop request from another thread
+CONNECT_TIMEOUT = 0.5      # Used until a host has answered, then the timeout follows its RTT
+BANNER_TIMEOUT = 1
+MIN_TIMEOUT = 0.1
+MAX_TIMEOUT = 3.0
+MAX_RETRIES = 1            # Extra tries for ports that timed out, never for ones that answered
+RTT_ALPHA = 1 / 8          # SRTT gain, as in TCP
+RTT_BETA = 1 / 4           # RTTVAR gain, as in TCP
+
+# Concurrency autotuning settings, the connect window is sized from the open file limit
+AUTOTUNE = True            # Back the window off on fd exhaustion and rising timeouts, then grow it again
+FD_RESERVE = 64            # Open files kept free for stdio, export files, DNS and the like
+FD_LIMIT_CAP = 65536       # Highest soft open file limit asked for when the hard limit is unlimited
+FD_LIMIT_FALLBACK = 10240  # First soft limit tried when the system refuses the one asked for (macOS OPEN_MAX), then halved
+AIMD_INCREASE = 8          # Connects added to the window after a round (one window of connects) without trouble
+AIMD_DECREASE = 0.5        # Window multiplier on fd exhaustion or a timeout rise
+TIMEOUT_RISE = 0.1         # Rise in a round's timeout share over the usual share that counts as congestion
+TIMEOUT_GAIN = 1 / 4       # How fast the usual timeout share follows the scan
+MIN_ROUND = 32             # Fewest connects a round is judged on
+MIN_CONCURRENCY = 32       # Timeouts never back the window off below this, running out of sockets can
+
+# Port ordering settings
+PORT_ORDER = "priority"    # "priority" scans TOP_PORTS first then the rest, "sequential" goes start to end
+
+# Target resolution settings
+RESOLVE_CONCURRENCY = 100  # DNS lookups in flight at once
+RESOLVE_FAMILY = "any"     # "ipv4", "ipv6" or "any"
+ALL_ADDRESSES = True       # Scan every address a name resolves to, not just the first
+DNS_CACHE_TTL = 300        # Seconds a lookup is reused for (getaddrinfo does not expose record TTLs)
+MAX_CIDR_HOSTS = 65536     # Largest CIDR range expanded (a /16), bigger ones (most IPv6 prefixes) are rejected
+
+# Host discovery settings, hosts that answer none of the probe ports are not port scanned
+HOST_DISCOVERY = True
+DISCOVERY_PORTS = [80, 443, 22, 445, 3389]
+DISCOVERY_TIMEOUT = 2
+DISCOVERY_CONCURRENCY = 64  # Hosts probed at once, each one holds len(DISCOVERY_PORTS) sockets
+
+# Rate limiting and progress settings
+MAX_RATE = 0               # Connects per second across the whole scan, 0 for no limit
+PER_HOST_RATE = 0          # Connects per second against any one host, 0 for no limit
+SHOW_PROGRESS = True       # Live progress line on stderr (only when it is a terminal)
+PROGRESS_INTERVAL = 0.5
+
+# Result export settings
+REPORT_CLOSED = False      # Also export closed and filtered ports, not just open ones
+WRITE_BUFFER = 64 * 1024   # Bytes buffered by the file sinks before they hit the disk
+EXPORT_EXTENSIONS = {".csv", ".jsonl", ".ndjson"}
+
+# Scan state settings, used when a state file is given
+STATE_SAVE_INTERVAL = 5    # Seconds between state file saves while a scan runs
+INCREMENTAL_SLICE = 4096   # Ports per host an incremental scan adds on top of the known open ones
+
+# Instrumentation settings
+METRICS_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]  # Latency histogram bounds in seconds
+
+# connect_ex results that mean no answer came back before the timeout
+TIMEOUT_ERRNOS = {errno.EAGAIN, errno.EWOULDBLOCK, errno.ETIMEDOUT, errno.EINPROGRESS}
+
+# Socket errors by the outcome they are counted as, anything else counts as "error"
+ERROR_OUTCOMES = {
+    errno.ECONNREFUSED: "refused",
+    errno.ECONNRESET: "reset",
+    errno.EHOSTUNREACH: "unreachable",
+    errno.ENETUNREACH: "unreachable",
+    errno.EMFILE: "fd_exhausted",
+    errno.ENFILE: "fd_exhausted",
+}
 
 
 # Prints a home screen 
@@ -17,131 +113,1752 @@ def homeScreen():
     print("\n" + "=" * 50 + "\n")
 
 
-# Gets the target from the user
+# Gets the targets from the user
 def getTarget():
-    target = input("Enter a URL or IP address to scan: ").strip()
+    print("Targets can be a URL, an IP address, a CIDR range (10.0.0.0/24),")
+    print("a comma separated list of those, or a file of targets (@targets.txt)")
+    targets = input("Enter the targets to scan: ").strip()
 
-    try:
-        ip = socket.gethostbyname(target) # Checks by URL and IP
-        print(f"[+] Target resolved to IP: {ip}")
-        return ip
-    
-    # Unless there is a address error
-    except socket.gaierror:
-        print("[-] Invalid URL or IP address")
+    # Names are resolved by the scan itself, ahead of the ports being probed
+    targets = parseTargets(targets)
+
+    if not targets:
+        print("[-] No valid targets")
         return None
-    
 
-# Checks if host is reachable 
-def checkHost(ip):
+    print(f"[+] {len(targets)} target(s) to scan")
+    return targets
+
+
+# Expands the target input into single hosts
+def parseTargets(text):
+    hosts = []
+
+    for item in text.replace(",", " ").split():
+        # Target files (@path) hold one target (or more) per line, # starts a comment
+        if item.startswith("@"):
+            path = item[1:]
+            try:
+                with open(path, encoding="utf-8") as f:
+                    for line in f:
+                        hosts.extend(parseTargets(line.split("#", 1)[0]))
+            except OSError:
+                print(f"[-] Could not read target file {path}", file=sys.stderr)
+            continue
+
+        # CIDR ranges are expanded to their usable hosts, as long as that stays a sane list
+        if "/" in item:
+            try:
+                network = ipaddress.ip_network(item, strict=False)
+            except ValueError:
+                print(f"[-] Invalid CIDR range {item}", file=sys.stderr)
+                continue
+
+            if network.num_addresses > MAX_CIDR_HOSTS:
+                print(f"[-] CIDR range {item} has {network.num_addresses} addresses, more than the {MAX_CIDR_HOSTS} allowed",
+                      file=sys.stderr)
+                continue
+
+            hosts.extend(str(host) for host in network.hosts())
+            continue
+
+        hosts.append(item)
+
+    return hosts
+
+
+# Remembers lookups for DNS_CACHE_TTL seconds, kept for the life of the process
+# so repeated scans of the same names skip the resolver
+class DnsCache:
+    def __init__(self, ttl=DNS_CACHE_TTL):
+        self.ttl = ttl
+        self.entries = {}
+
+    def get(self, host):
+        entry = self.entries.get(host)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def put(self, host, addresses):
+        self.entries[host] = (time.monotonic() + self.ttl, addresses)
+
+
+dnsCache = DnsCache()
+
+RESOLVE_FAMILIES = {"ipv4": socket.AF_INET, "ipv6": socket.AF_INET6, "any": socket.AF_UNSPEC}
+
+
+# Resolves one host name to its addresses
+async def resolveHost(host, slots):
+    addresses = dnsCache.get(host)
+    if addresses is not None:
+        return addresses
+
+    loop = asyncio.get_running_loop()
+
+    async with slots:
+        try:
+            infos = await loop.getaddrinfo(host, None, family=RESOLVE_FAMILIES[RESOLVE_FAMILY], type=socket.SOCK_STREAM)
+        except (socket.gaierror, UnicodeError):
+            print(f"[-] Invalid URL or IP address: {host}", file=sys.stderr)
+            return []
+
+    # Keeps resolver order, which already puts the preferred address first
+    addresses = list(dict.fromkeys(info[4][0] for info in infos))
+    if not ALL_ADDRESSES:
+        addresses = addresses[:1]
+
+    dnsCache.put(host, addresses)
+    return addresses
+
+
+# Resolves targets concurrently and yields (ip, names) as each new IP comes in,
+# so scanning can start on the first hosts while the rest are still resolving.
+# names is the set of targets that share the IP, it keeps growing as later lookups land on it
+async def resolveStream(targets):
+    slots = asyncio.Semaphore(RESOLVE_CONCURRENCY)
+    names = {}
+    literals = []
+    lookups = []
+
+    async def lookup(host):
+        return host, await resolveHost(host, slots)
+
+    # Start the lookups first, IP literals need none and are handed out while they run
+    for host in dict.fromkeys(targets):
+        try:
+            literals.append((host, [str(ipaddress.ip_address(host))]))
+        except ValueError:
+            lookups.append(asyncio.ensure_future(lookup(host)))
+
+    async def resolved():
+        for item in literals:
+            yield item
+        for future in asyncio.as_completed(lookups):
+            yield await future
+
+    async for host, addresses in resolved():
+        for ip in addresses:
+            if ip in names:
+                names[ip].add(host)
+                continue
+
+            names[ip] = {host}
+            yield ip, names[ip]
+
+
+# Resolves (and discovers) every target before returning, for the engines that need the
+# whole work list up front. Returns (ip, names, rtt) for each host to scan
+def resolveTargets(targets, limiter, discovery):
+    async def collect():
+        return [item async for item in liveHosts(targets, limiter, discovery)]
+
+    return asyncio.run(collect())
+
+
+# Address family for an IP string
+def socketFamily(ip):
+    return socket.AF_INET6 if ":" in ip else socket.AF_INET
+
+
+# Checks if host is reachable, connects to all DISCOVERY_PORTS at once.
+# Any answer, open or refused, means the host is up, and the answers seed its RTT estimate
+async def checkHost(ip, rtt, limiter):
+    async def probe(port):
+        delay = limiter.delay(ip)
+        if delay:
+            await asyncio.sleep(delay)
+
+        outcome, s, elapsed = await asyncConnection(ip, port, rtt, timeout=DISCOVERY_TIMEOUT)
+        if s is not None:
+            s.close()
+
+        # A probe that never went out says nothing about the host, try again for a while as the scan frees sockets
+        for _ in range(int(DISCOVERY_TIMEOUT / STOP_POLL_INTERVAL)):
+            if outcome != "fd_exhausted":
+                break
+
+            await asyncio.sleep(STOP_POLL_INTERVAL)
+            outcome, s, elapsed = await asyncConnection(ip, port, rtt, timeout=DISCOVERY_TIMEOUT)
+            if s is not None:
+                s.close()
+
+    probes = [asyncio.create_task(probe(port)) for port in DISCOVERY_PORTS]
+
     try:
-        socket.setdefaulttimeout(1)
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM) # sets up a tcp internet connection
-        s.settimeout(2)
-        s.connect((ip, 80))
-        s.close()
+        for finished in asyncio.as_completed(probes):
+            await finished
 
-        print("[+] Host is reachable")
-        return True
-    
-    except socket.timeout:
-        print("[-] Connection timed out")
+            # Only connects that got an answer add an RTT sample
+            if rtt.samples:
+                return True
 
-    except ConnectionRefusedError:
-        print("[-] Host reachable but port 80 is closed")
-        return True
-    
-    except OSError:
-        print("[-] Network unreachable")
         return False
-    
+    finally:
+        for task in probes:
+            task.cancel()
+
+
+# Runs checkHost over (ip, names) hosts as they arrive and yields (ip, names, rtt) for the ones that are up
+async def discoverStream(hosts, limiter):
+    slots = asyncio.Semaphore(DISCOVERY_CONCURRENCY)
+    answered = asyncio.Queue()
+    checks = set()
+    counts = collections.Counter()
 
-# Asks user for a range of ports to scan
+    async def check(ip, names):
+        try:
+            rtt = RttEstimator()
+            counts["total"] += 1
+
+            if await checkHost(ip, rtt, limiter):
+                counts["up"] += 1
+                answered.put_nowait((ip, names, rtt))
+        finally:
+            slots.release()
+
+    async def produce():
+        try:
+            async for ip, names in hosts:
+                await slots.acquire()
+                task = asyncio.create_task(check(ip, names))
+                checks.add(task)
+                task.add_done_callback(checks.discard)
+
+            await asyncio.gather(*checks)
+        finally:
+            answered.put_nowait(None)
+
+    producer = asyncio.create_task(produce())
+
+    while True:
+        item = await answered.get()
+        if item is None:
+            break
+        yield item
+
+    await producer
+    print(f"[+] {counts['up']} of {counts['total']} host(s) answered the discovery probes", file=sys.stderr)
+
+
+# Resolved hosts ready to scan as (ip, names, rtt), through host discovery when it is on
+async def liveHosts(targets, limiter, discovery):
+    if discovery:
+        async for item in discoverStream(resolveStream(targets), limiter):
+            yield item
+    else:
+        async for ip, names in resolveStream(targets):
+            yield ip, names, RttEstimator()
+
+
+# Asks user for the ports to scan, a range, a list or topN for only the N most common ports.
+# Returns ports, topN (topN is None unless topN was asked for)
 def getPortRange():
     while True:
-        user_input = input("\nEnter port range (e.g. 20-8080): ").strip()
+        user_input = input("\nEnter port range (e.g. 20-8080, 22,80,443, or top100 for the 100 most common ports): ").strip()
 
         try:
-            # Split on dash
-            startStr, endStr = user_input.split("-")
+            return parsePorts(user_input)
+        except ValueError as error:
+            print(f"[-] {error}")
 
-            # Convert to int
-            startPort = int(startStr)
-            endPort = int(endStr)
 
-            # Validate range
-            if 1 <= startPort <= 65535 and 1 <= endPort <=65535:
-                if startPort <= endPort:
-                    return startPort, endPort
-            
-            print("[-] Port range must be between 1 and 65535 and the starting port must be less than or equal to the ending port")
+# Parses a port spec: a range (20-8080), a list of ports and ranges (22,80,8000-8100) or topN.
+# Returns ports (ascending, a range when there are no gaps) and topN, raises ValueError on bad input
+def parsePorts(text):
+    text = text.strip().lower()
+    usage = "Invalid format. Use: start-end (example: 20-8080), a list (example: 22,80,443) or topN (example: top100)"
+
+    # Top N mode scans the N highest ranked ports out of the whole range
+    if text.startswith("top"):
+        try:
+            topN = int(text[3:])
+        except ValueError:
+            raise ValueError(usage)
+
+        if topN < 1:
+            raise ValueError("Top N must be at least 1")
+        if topN > len(RANKED_PORTS):
+            raise ValueError(f"Top N can be at most {len(RANKED_PORTS)}, the number of ranked ports")
+        return range(1, 65536), topN
+
+    ports = set()
+    for item in text.split(","):
+        item = item.strip()
+        if not item:
+            continue
 
+        # Split on dash, a single port is a range of one
+        startStr, dash, endStr = item.partition("-")
+        try:
+            startPort = int(startStr)
+            endPort = int(endStr) if dash else startPort
         except ValueError:
-            # Raised if split or int conversion fails
-            print("[-] Invalid format. Use: start-end (example: 20-8080)")
+            raise ValueError(usage)
+
+        # Validate range
+        if not (1 <= startPort <= endPort <= 65535):
+            raise ValueError("Port range must be between 1 and 65535 and the starting port must be less than or equal to the ending port")
+
+        ports.update(range(startPort, endPort + 1))
+
+    if not ports:
+        raise ValueError(usage)
+
+    ports = sorted(ports)
+    if ports[-1] - ports[0] + 1 == len(ports):
+        return range(ports[0], ports[-1] + 1), None
+    return ports, None
+
+
+# Order to scan the ports in. Priority order puts the ports in TOP_PORTS first (most
+# often open first) so the useful results show up in the first moments of a long sweep.
+# topN keeps only the first N ports of that order, raises ValueError past the end of the ranking
+def orderPorts(ports, order=None, topN=None):
+    order = order or PORT_ORDER
+
+    # Past the ranking the "top" ports would just be the lowest unranked ones
+    if topN and topN > len(RANKED_PORTS):
+        raise ValueError(f"Top N can be at most {len(RANKED_PORTS)}, the number of ranked ports")
+
+    if order == "sequential" and not topN:
+        return ports
+
+    wanted = set(ports)
+    ranked = [port for port in RANKED_PORTS if port in wanted]
+
+    # Top N over ports that hold fewer ranked ones is filled up with the rest of the ports in order
+    if topN and topN <= len(ranked):
+        return ranked[:topN]
+
+    rankedSet = set(ranked)
+    rest = (port for port in ports if port not in rankedSet)
+    ports = ranked + list(rest)
+
+    return ports[:topN] if topN else ports
+
+# Per host round trip estimate, same math TCP uses for its retransmission timeout (RFC 6298).
+# Connects that get an answer (open or refused) are RTT samples, the timeout is SRTT + 4 * RTTVAR.
+class RttEstimator:
+    def __init__(self):
+        self.srtt = None
+        self.rttvar = None
+        self.samples = 0
+        self.lock = threading.Lock()
+
+    def update(self, rtt):
+        with self.lock:
+            if self.srtt is None:
+                self.srtt = rtt
+                self.rttvar = rtt / 2
+            else:
+                self.rttvar = (1 - RTT_BETA) * self.rttvar + RTT_BETA * abs(self.srtt - rtt)
+                self.srtt = (1 - RTT_ALPHA) * self.srtt + RTT_ALPHA * rtt
+            self.samples += 1
+
+    # Connect timeout, backed off exponentially for retries like a TCP retransmit
+    def timeout(self, attempt=0):
+        if self.srtt is None:
+            rto = CONNECT_TIMEOUT
+        else:
+            rto = self.srtt + 4 * self.rttvar
+
+        rto = rto * (2 ** attempt)
+        return min(max(rto, MIN_TIMEOUT), MAX_TIMEOUT)
+
+    # Banner reads wait for the service to talk, so the RTT only stretches the fixed wait
+    def bannerTimeout(self):
+        return min(BANNER_TIMEOUT + self.timeout(), MAX_TIMEOUT)
+
+
+# Raises the soft open file limit as far as the hard limit lets it and returns the soft limit,
+# None where there is no such limit to go by
+def raiseFdLimit():
+    if resource is None:
+        return None
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft == resource.RLIM_INFINITY:
+        return FD_LIMIT_CAP
+
+    target = FD_LIMIT_CAP if hard == resource.RLIM_INFINITY else min(hard, FD_LIMIT_CAP)
+    while soft < target:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+            soft = target
+        except (ValueError, OSError):
+            # Some systems cap it below the hard limit (macOS at OPEN_MAX), step down until one is taken
+            target = FD_LIMIT_FALLBACK if target > FD_LIMIT_FALLBACK else target // 2
+
+    return soft
+
+
+# Splits the open file limit, less FD_RESERVE (and the probes for discoveryHosts targets when host discovery
+# runs alongside the scan), between connects in flight and sockets waiting on banners.
+# The discovery probes never push the connects below MIN_CONCURRENCY while the limit has room for that many,
+# AIMD backs the window off if they do run out of sockets. Returns (connects, banners), never more than asked for
+def fdPlan(connects, banners=None, discoveryHosts=0):
+    banners = BANNER_CONCURRENCY if banners is None else banners
+
+    limit = raiseFdLimit()
+    if limit is None:
+        return connects, banners
+
+    budget = limit - FD_RESERVE
+    floor = max(1, min(connects, MIN_CONCURRENCY, budget))
+    scanBudget = budget - min(DISCOVERY_CONCURRENCY, discoveryHosts) * len(DISCOVERY_PORTS)
+
+    banners = min(banners, max(1, scanBudget // 4)) if banners else 0
+    return max(floor, min(connects, scanBudget - banners)), banners
+
+
+# Connects allowed in flight, AIMD like TCP congestion control. It starts at the most the
+# open file limit allows and, with AUTOTUNE on, is halved when sockets run out or a round
+# (one window of connects) times out noticeably more than usual, then grows by AIMD_INCREASE a round.
+# The async scheduler reads limit directly, thread workers take a slot with acquire()
+class ConcurrencyWindow:
+    def __init__(self, maximum):
+        self.maximum = maximum
+        self.limit = maximum
+        self.lowest = maximum
+        self.decreases = 0
+        self.active = 0
+        self.count = 0
+        self.timeouts = 0
+        self.sinceDecrease = maximum
+        self.baseline = None
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.active >= self.limit:
+                self.condition.wait()
+            self.active += 1
+
+    def release(self, outcome):
+        self.record(outcome)
+
+        with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    # Called with the outcome of every connect
+    def record(self, outcome):
+        if not AUTOTUNE:
+            return
+
+        with self.condition:
+            self.sinceDecrease += 1
+
+            if outcome == "fd_exhausted":
+                self.decrease()
+                return
+
+            self.count += 1
+            if outcome == "timeout":
+                self.timeouts += 1
+
+            if self.count < max(self.limit, MIN_ROUND):
+                return
+
+            # The usual timeout share follows the scan along, so a range that is filtered
+            # throughout only slows the scan down until it becomes the new normal
+            share = self.timeouts / self.count
+            if self.baseline is not None and share > self.baseline + TIMEOUT_RISE:
+                self.decrease(min(self.maximum, MIN_CONCURRENCY))
+            else:
+                self.limit = min(self.maximum, self.limit + AIMD_INCREASE)
+
+            self.baseline = share if self.baseline is None else (1 - TIMEOUT_GAIN) * self.baseline + TIMEOUT_GAIN * share
+            self.count = 0
+            self.timeouts = 0
+
+    # At most once per window of connects, one burst of errors is one signal
+    def decrease(self, floor=1):
+        if self.sinceDecrease < self.limit or self.limit <= floor:
+            return
+
+        self.limit = max(floor, int(self.limit * AIMD_DECREASE))
+        self.lowest = min(self.lowest, self.limit)
+        self.decreases += 1
+        self.sinceDecrease = 0
+
+    def summary(self):
+        return {"maximum": self.maximum, "final": self.limit, "lowest": self.lowest, "decreases": self.decreases}
+
+
+# Gets port connection, returns "open", "closed", "timeout" or "fd_exhausted" when no socket could be made
+def connection(ip, port, rtt, collector, attempt=0):
+    metrics = collector.metrics
 
-# Gets port connection
-def connection(ip, port):
     try:
-        # Creates a TCP Socket (IPv4 + TCP)
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Creates a TCP Socket (IPv4 or IPv6 + TCP)
+        s = socket.socket(socketFamily(ip), socket.SOCK_STREAM)
+    except OSError as error:
+        outcome = errorOutcome(error)
+        metrics.connect(outcome)
+        return "fd_exhausted" if outcome == "fd_exhausted" else "closed"
+
+    metrics.socketOpened()
 
-        # Sets a timeout 
-        s.settimeout(0.5)
+    try:
+        # Sets a timeout from the measured round trip time
+        s.settimeout(rtt.timeout(attempt))
 
         # connect_ex returns a 0 if the connection is successful
+        start = time.monotonic()
         result = s.connect_ex((ip, port))
+        elapsed = time.monotonic() - start
+
+        if result in TIMEOUT_ERRNOS:
+            metrics.connect("timeout")
+            return "timeout"
+
+        if result == 0 and isSelfConnect(s):
+            metrics.connect("self_connect")
+            collector.add(makeResult(ip, port, "closed"))
+            return "closed"
+
+        # An answer either way is a round trip sample
+        if result in (0, errno.ECONNREFUSED):
+            rtt.update(elapsed)
+            metrics.connect("open" if result == 0 else "refused", elapsed)
+        else:
+            metrics.connect(errorOutcome(result))
 
+        if result == 0:
+            # Read the banner on the same connection instead of a second handshake
+            s.settimeout(rtt.bannerTimeout())
+            banner = getBanner(s, metrics)
+            collector.add(makeResult(ip, port, "open", banner, elapsed))
+        elif result == errno.ECONNREFUSED:
+            collector.add(makeResult(ip, port, "closed", rtt=elapsed))
+        else:
+            collector.add(makeResult(ip, port, "closed"))
+
+        return "open" if result == 0 else "closed"
+    except OSError as error:
+        metrics.connect(errorOutcome(error))
+        return "closed"
+    finally:
         # Close connection
         s.close()
+        metrics.socketClosed()
 
-        if result == 0:
-            service = COMMON_SERVICES.get(port, "Unknown")
 
-            banner = getBanner(ip,port)
+# Names the outcome of a socket error (or a connect_ex errno) for the metrics
+def errorOutcome(error):
+    if isinstance(error, (socket.timeout, asyncio.TimeoutError)):
+        return "timeout"
+
+    code = error.errno if isinstance(error, OSError) else error
+    if code in TIMEOUT_ERRNOS:
+        return "timeout"
+
+    return ERROR_OUTCOMES.get(code, "error")
+
+
+# Single thread worker
+def worker(portQueue, estimators, collector, limiter, timedOut, attempt, stop, window):
+    # Each thread runs this function, it pulls (ip, port) items from the queue and scans them.
+    # The queue is filled before the workers start, so an empty queue means the pass is over
+    while not stop.is_set():
+        try:
+            ip, port = portQueue.get_nowait()
+        except queue.Empty:
+            return
+
+        time.sleep(limiter.delay(ip))
+
+        window.acquire()
+        outcome = "closed"
+        try:
+            outcome = connection(ip, port, estimators[ip], collector, attempt)
+        finally:
+            window.release(outcome)
+
+        if outcome == "timeout":
+            timedOut.append((ip, port))
+        elif outcome == "fd_exhausted":
+            # Out of file descriptors, try again once the window has shrunk. With no other
+            # socket open nothing will free one up, so the port is given up on as closed
+            if collector.metrics.inFlight:
+                portQueue.put((ip, port))
+            else:
+                collector.add(makeResult(ip, port, "closed"))
+
+
+# Round robin over the hosts in the work list, yields (ip, port)
+def interleave(work):
+    lanes = [[(ip, port) for port in ports] for ip, ports in work]
+
+    for items in itertools.zip_longest(*lanes):
+        for item in items:
+            if item is not None:
+                yield item
+
 
-            if banner:
-                print(f"[OPEN] {port:<6} {service:<15} {banner}")
+# Thread controller, work is a list of (ip, ports). Setting stop ends the scan after the current ports
+def threadScanPorts(work, collector, limiter, estimators=None, stop=None):
+    estimators = estimators or {ip: RttEstimator() for ip, ports in work}
+    stop = stop or threading.Event()
+
+    # Every thread holds one socket at a time, so the thread count is cut to what the open file limit allows
+    threadCount, banners = fdPlan(THREAD_COUNT, banners=0)
+    window = ConcurrencyWindow(threadCount)
+    collector.metrics.window = window
+
+    # Add all ports to the work list, interleaved across hosts
+    items = list(interleave(work))
+
+    for attempt in range(MAX_RETRIES + 1):
+        portQueue = queue.Queue()
+        for item in items:
+            portQueue.put(item)
+
+        timedOut = []
+
+        # Start worker threads
+        threads = []
+        for _ in range(threadCount):
+            t = threading.Thread(target=worker, args=(portQueue, estimators, collector, limiter, timedOut, attempt, stop, window))
+            t.daemon = True
+            t.start()
+            threads.append(t)
+
+        # Wait until all ports are scanned, on Ctrl-C let the workers finish their current port and stop
+        try:
+            for t in threads:
+                t.join()
+        except KeyboardInterrupt:
+            stop.set()
+            raise
+
+        # Retry only the ports that timed out, on hosts that answered at least once
+        items = []
+        for ip, port in timedOut:
+            if attempt < MAX_RETRIES and estimators[ip].samples:
+                items.append((ip, port))
             else:
-                print(f"[OPEN] {port:<6} {service:<15}")
-    except:
+                collector.add(makeResult(ip, port, "filtered"))
+
+        if not items or stop.is_set():
+            break
+
+
+# A connect to a closed local port inside the ephemeral range can be given that same port as
+# its source, and TCP simultaneous open then "connects" the socket to itself. That is not a service
+def isSelfConnect(s):
+    try:
+        return s.getsockname() == s.getpeername()
+    except OSError:
+        return False
+
+
+# Non-blocking port connection, returns the outcome and the connected socket for open ports.
+# The outcome is "open", "closed", "timeout" or "fd_exhausted" when no socket could be made.
+# An open socket still counts as in flight in metrics until whoever takes it closes it
+async def asyncConnection(ip, port, rtt, attempt=0, timeout=None, metrics=None):
+    loop = asyncio.get_running_loop()
+    metrics = metrics or ScanMetrics()
+
+    try:
+        s = socket.socket(socketFamily(ip), socket.SOCK_STREAM)
+    except OSError as error:
+        outcome = errorOutcome(error)
+        metrics.connect(outcome)
+        return "fd_exhausted" if outcome == "fd_exhausted" else "closed", None, None
+
+    metrics.socketOpened()
+
+    try:
+        s.setblocking(False)
+
+        # The timeout cancels the pending connect so the slot is freed for the next port
+        start = loop.time()
+        await asyncio.wait_for(loop.sock_connect(s, (ip, port)), timeout or rtt.timeout(attempt))
+        elapsed = loop.time() - start
+
+        if isSelfConnect(s):
+            metrics.connect("self_connect")
+            outcome, elapsed = "closed", None
+        else:
+            rtt.update(elapsed)
+            metrics.connect("open", elapsed)
+            return "open", s, elapsed
+    except asyncio.TimeoutError:
+        metrics.connect("timeout")
+        outcome, elapsed = "timeout", None
+    except ConnectionRefusedError:
+        elapsed = loop.time() - start
+        rtt.update(elapsed)
+        metrics.connect("refused", elapsed)
+        outcome = "closed"
+    except OSError as error:
+        metrics.connect(errorOutcome(error))
+        outcome, elapsed = "closed", None
+    except asyncio.CancelledError:
+        s.close()
+        metrics.socketClosed()
+        raise
+
+    s.close()
+    metrics.socketClosed()
+    return outcome, None, elapsed
+
+
+# Second pipeline stage, reads the banner on the socket that found the port open
+async def asyncBannerStage(s, host, port, elapsed, collector, bannerSlots):
+    try:
+        banner = await asyncGetBanner(s, host.rtt.bannerTimeout(), collector.metrics)
+        collector.add(makeResult(host.ip, port, "open", banner, elapsed))
+    finally:
+        s.close()
+        collector.metrics.socketClosed()
+        bannerSlots.release()
+
+
+# Scan state for one host: ports left to try, ports waiting on a retry and its RTT estimate
+class ScanHost:
+    def __init__(self, ip, ports, rtt=None):
+        self.ip = ip
+        self.ports = iter(ports)
+        self.retries = collections.deque()
+        self.rtt = rtt or RttEstimator()
+
+    # Next (port, attempt), first passes come before retries so the RTT estimate has settled
+    def nextPort(self):
+        port = next(self.ports, None)
+        if port is not None:
+            return port, 0
+
+        if self.retries:
+            return self.retries.popleft()
+
+        return None
+
+
+# Hands out (host, port, attempt) work items round robin across hosts.
+# A host that already has perHostLimit connects in flight is skipped until one finishes,
+# so one slow host never holds up the others.
+# The window caps connects in flight across all hosts (see ConcurrencyWindow).
+# stop is a threading.Event, once it is set no more work is handed out
+class ScanScheduler:
+    def __init__(self, window, perHostLimit=None, stop=None):
+        self.window = window
+        self.perHostLimit = perHostLimit or PER_HOST_CONCURRENCY
+        self.stop = stop
+        self.hosts = collections.deque()
+        self.inFlight = collections.Counter()
+        self.active = 0
+        self.released = asyncio.Event()
+        self.finished = False
+
+    # Hosts can be added while the scan runs, call finish() once there are no more coming
+    def addHost(self, ip, ports, rtt=None):
+        self.hosts.append(ScanHost(ip, ports, rtt))
+        self.released.set()
+
+    def finish(self):
+        self.finished = True
+        self.released.set()
+
+    def stopped(self):
+        return self.stop is not None and self.stop.is_set()
+
+    # Next work item, or None once every host is finished or the scan was stopped
+    async def next(self):
+        while (self.hosts or not self.finished) and not self.stopped():
+            # A shrunken window holds workers back until enough connects have finished
+            hosts = len(self.hosts) if self.active < self.window.limit else 0
+
+            for _ in range(hosts):
+                host = self.hosts[0]
+                self.hosts.rotate(-1)
+
+                if self.inFlight[host.ip] >= self.perHostLimit:
+                    continue
+
+                item = host.nextPort()
+                if item is None:
+                    # Connects still in flight may queue retries, so only drop idle hosts
+                    if not self.inFlight[host.ip]:
+                        self.hosts.remove(host)
+                        break
+                    continue
+
+                self.inFlight[host.ip] += 1
+                self.active += 1
+                return host, item[0], item[1]
+            else:
+                # Nothing can be handed out right now, wait for a connect to finish or a new host
+                self.released.clear()
+                if self.stop is None:
+                    await self.released.wait()
+                    continue
+
+                # A stop request comes from another thread and cannot set the event, so check for it now and then
+                try:
+                    await asyncio.wait_for(self.released.wait(), STOP_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+
+        return None
+
+    # Marks a work item finished, timed out ports are queued for a retry and ports that
+    # could not get a socket are queued again as they were. Returns True when the port was queued again
+    def done(self, host, port, attempt, outcome):
+        retry = outcome == "timeout" and attempt < MAX_RETRIES and host.rtt.samples > 0
+        if retry:
+            host.retries.append((port, attempt + 1))
+        elif outcome == "fd_exhausted":
+            host.retries.append((port, attempt))
+            retry = True
+
+        self.inFlight[host.ip] -= 1
+        self.active -= 1
+        self.window.record(outcome)
+        self.released.set()
+        return retry
+
+
+# Async worker, pulls work items from the scheduler until it runs out
+async def asyncWorker(scheduler, collector, limiter, bannerSlots, bannerTasks):
+    while True:
+        item = await scheduler.next()
+        if item is None:
+            return
+
+        host, port, attempt = item
+        outcome = "closed"
+        try:
+            delay = limiter.delay(host.ip)
+            if delay:
+                await asyncio.sleep(delay)
+
+            outcome, s, elapsed = await asyncConnection(host.ip, port, host.rtt, attempt, metrics=collector.metrics)
+
+            # With no other socket open nothing will free a file descriptor, so the port is given up on as closed
+            if outcome == "fd_exhausted" and not collector.metrics.inFlight:
+                outcome = "closed"
+        finally:
+            retried = scheduler.done(host, port, attempt, outcome)
+
+        if s is None:
+            if not retried:
+                state = "filtered" if outcome == "timeout" else "closed"
+                collector.add(makeResult(host.ip, port, state, rtt=elapsed))
+            continue
+
+        # Hand the open socket to the banner stage and move on to the next port.
+        # Waiting for a slot bounds how many sockets silent services can hold open.
+        await bannerSlots.acquire()
+        bannerTasks.add(asyncio.create_task(asyncBannerStage(s, host, port, elapsed, collector, bannerSlots)))
+
+
+# Async controller, every worker is one connect in flight. work is a list of (ip, ports)
+async def asyncScanPorts(work, collector, limiter, concurrency=None, perHostLimit=None):
+    concurrency, banners = fdPlan(concurrency or MAX_CONCURRENCY)
+    window = ConcurrencyWindow(concurrency)
+    collector.metrics.window = window
+
+    scheduler = ScanScheduler(window, perHostLimit)
+    for ip, ports in work:
+        scheduler.addHost(ip, ports)
+    scheduler.finish()
+
+    workerCount = min(concurrency, sum(len(ports) for ip, ports in work))
+    await runWorkers(scheduler, collector, limiter, workerCount, banners)
+
+
+# Async controller for target names, each host joins the scan as soon as it resolves
+# (and has answered host discovery, when that is on)
+async def asyncScanTargets(targets, ports, collector, limiter, discovery, state=None, stop=None):
+    # Names can resolve to several addresses, AIMD covers the few extra probes that makes
+    concurrency, banners = fdPlan(MAX_CONCURRENCY, discoveryHosts=len(targets) if discovery else 0)
+    window = ConcurrencyWindow(concurrency)
+    collector.metrics.window = window
+
+    scheduler = ScanScheduler(window, stop=stop)
+
+    async def feed():
+        try:
+            async for ip, names, rtt in liveHosts(targets, limiter, discovery):
+                hostPorts = state.plan(ip, ports) if state else ports
+                collector.addHost(ip, names, len(hostPorts))
+                scheduler.addHost(ip, hostPorts, rtt)
+        finally:
+            scheduler.finish()
+
+    feeder = asyncio.create_task(feed())
+    await runWorkers(scheduler, collector, limiter, concurrency, banners)
+
+    if scheduler.stopped():
+        # Stopped early, names still resolving are not needed any more
+        feeder.cancel()
+        await asyncio.wait([feeder])
+    else:
+        await feeder
+
+
+# Runs the connect workers until the scheduler is out of work, with up to banners sockets waiting on banners
+async def runWorkers(scheduler, collector, limiter, workerCount, banners):
+    bannerSlots = asyncio.Semaphore(banners)
+    bannerTasks = set()
+
+    await asyncio.gather(*(asyncWorker(scheduler, collector, limiter, bannerSlots, bannerTasks) for _ in range(workerCount)))
+
+    # Let the last banner reads finish
+    await asyncio.gather(*bannerTasks)
+
+
+# Splits the work into shards of about SHARD_SIZE (host, port) items.
+# Shards follow the work order (hosts, then each host's ports in scan order, priority or sequential)
+# so their results can be merged back in that order
+def makeShards(work, shardSize=None):
+    shardSize = shardSize or SHARD_SIZE
+    shards = []
+    shard = []
+    size = 0
+
+    for ip, ports in work:
+        # A host can start part way into a shard, so the piece width follows the room left in it
+        start = 0
+        while start < len(ports):
+            take = min(shardSize - size, len(ports) - start)
+            shard.append((ip, ports[start:start + take]))
+            size += take
+            start += take
+
+            if size >= shardSize:
+                shards.append(shard)
+                shard = []
+                size = 0
+
+    if shard:
+        shards.append(shard)
+
+    # Every item lands in exactly one shard, anything else would scan ports twice or not at all
+    expected = sum(len(ports) for ip, ports in work)
+    sharded = sum(len(piece) for shard in shards for ip, piece in shard)
+    if sharded != expected:
+        raise RuntimeError(f"Sharding produced {sharded} items for {expected} (host, port) pairs")
+
+    return shards
+
+
+# Runs in a pool process, scans one shard with its own async engine and sends back the results
+# in the shard's work order (not port order, priority order puts ranked ports first) along with the shard's metrics
+def scanShard(args):
+    shard, concurrency, perHostLimit, rate, perHostRate = args
+
+    buffer = ResultBuffer()
+    limiter = RateLimiter(rate, perHostRate)
+    asyncio.run(asyncScanPorts(shard, buffer, limiter, concurrency, perHostLimit))
+
+    position = {(ip, port): index for index, (ip, port) in enumerate((ip, port) for ip, ports in shard for port in ports)}
+    buffer.results.sort(key=lambda result: position[(result.ip, result.port)])
+    return buffer.results, buffer.metrics.snapshot()
+
+
+# Sharded controller, every process runs its own async engine (own GIL, own fd limit).
+# imap hands shards back in submission order, so the merged stream follows the work order (see makeShards).
+# Setting stop drops the shards that have not come back yet
+def shardScanPorts(work, collector, processes=None, stop=None):
+    processes = processes or SHARD_PROCESSES
+
+    # Each process gets the full connect window but the per host window is split between them,
+    # since several processes can be working on the same host at once
+    shards = makeShards(work)
+    processes = max(1, min(processes, len(shards)))
+    perHostLimit = max(1, PER_HOST_CONCURRENCY // processes)
+
+    # Rate limits are split the same way, each process only sees its own connects
+    rate = MAX_RATE / processes
+    perHostRate = PER_HOST_RATE / processes
+
+    shards = [(shard, MAX_CONCURRENCY, perHostLimit, rate, perHostRate) for shard in shards]
+
+    # Workers start from the settings changed through configure(), not the module defaults
+    with multiprocessing.Pool(processes, applySettings, (dict(settingOverrides),)) as pool:
+        for results, metrics in pool.imap(scanShard, shards):
+            collector.metrics.merge(metrics)
+            for result in results:
+                collector.add(result)
+
+            if stop is not None and stop.is_set():
+                break
+
+
+# Picks the scan engine, the thread pool is kept as a fallback.
+# targets is a target spec (see parseTargets) or a list of them, results go to the console and any export files.
+# ports is a port spec (see parsePorts) or a collection of ports.
+# Host discovery skips hosts that do not answer, discovery=False force-scans every target.
+# order and topN pick the port order (see orderPorts).
+# statePath keeps scan state on disk, stateMode is "full", "resume" or "incremental" (see ScanState).
+# sinks get every result next to the export files, console=False keeps the console quiet.
+# stop is a threading.Event another thread can set to end the scan early.
+# metrics collects the scan's instrumentation (see ScanMetrics), metricsPath writes it out at the end.
+# onChanges gets the list of ScanChange tuples against the state file once the scan is done
+def scanPorts(targets, ports, engine=None, exportPaths=(), discovery=None, order=None, topN=None,
+              statePath=None, stateMode="full", reportClosed=None, sinks=(), console=True, stop=None,
+              metrics=None, metricsPath=None, onChanges=None):
+    engine = engine or SCAN_ENGINE
+    discovery = HOST_DISCOVERY if discovery is None else discovery
+
+    # Same target syntax as the prompt and the CLI: CIDR ranges, comma lists and @files
+    if isinstance(targets, str):
+        targets = [targets]
+    targets = [host for item in targets for host in parseTargets(item)]
+
+    if isinstance(ports, str):
+        ports, specTopN = parsePorts(ports)
+        topN = topN or specTopN
+    elif not isinstance(ports, range):
+        ports = sorted(set(ports))
+
+    ports = orderPorts(ports, order, topN)
+    state = ScanState(statePath, stateMode) if statePath else None
+
+    sinks = ([ConsoleSink()] if console else []) + [makeSink(path) for path in exportPaths] + list(sinks)
+    collector = ResultCollector(sinks, reportClosed, state, metrics)
+    collector.start()
+
+    limiter = RateLimiter(MAX_RATE, PER_HOST_RATE)
+    cancelled = False
+
+    try:
+        if engine in ("thread", "shard"):
+            # These engines need the whole work list, so resolve everything first
+            hosts = resolveTargets(targets, limiter, discovery)
+
+            work = []
+            for ip, names, rtt in hosts:
+                hostPorts = state.plan(ip, ports) if state else ports
+                collector.addHost(ip, names, len(hostPorts))
+                work.append((ip, hostPorts))
+
+            if engine == "thread":
+                threadScanPorts(work, collector, limiter, {ip: rtt for ip, names, rtt in hosts}, stop)
+            else:
+                shardScanPorts(work, collector, stop=stop)
+        else:
+            asyncio.run(asyncScanTargets(targets, ports, collector, limiter, discovery, state, stop))
+
+    # Ctrl-C stops the scan but everything found so far is still written out
+    except KeyboardInterrupt:
+        cancelled = True
+        print("\n[-] Scan cancelled, writing partial results", file=sys.stderr)
+    finally:
+        collector.close()
+
+    if metricsPath:
+        collector.metrics.export(metricsPath)
+
+    if state:
+        changes = state.diff()
+        if console:
+            printChanges(changes)
+        if onChanges:
+            onChanges(changes)
+
+    return not cancelled and not (stop is not None and stop.is_set())
+
+
+# Library entry point, runs the scan on a background thread and yields ScanResult tuples as they come in.
+# ports is a port spec ("1-1024", "22,80,443", "top100") or a collection of ports, options are the
+# scanPorts keywords (engine, discovery, order, exportPaths, statePath, reportClosed, onChanges, ...).
+# Nothing is printed for the results. Closing the iterator early stops the scan
+def scan(targets, ports="1-1024", **options):
+    results = queue.Queue()
+    stop = threading.Event()
+    errors = []
+
+    def run():
+        try:
+            scanPorts(targets, ports, sinks=[QueueSink(results.put)], console=False, stop=stop, **options)
+        except BaseException as error:
+            errors.append(error)
+        finally:
+            results.put(None)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            result = results.get()
+            if result is None:
+                break
+            yield result
+    finally:
+        stop.set()
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+
+# Async iterator version of scan() for callers that already run an event loop.
+# The scan keeps its own thread and event loop, results are handed over to the caller's loop
+async def scanAsync(targets, ports="1-1024", **options):
+    loop = asyncio.get_running_loop()
+    results = asyncio.Queue()
+    stop = threading.Event()
+
+    def put(result):
+        loop.call_soon_threadsafe(results.put_nowait, result)
+
+    def run():
+        scanPorts(targets, ports, sinks=[QueueSink(put)], console=False, stop=stop, **options)
+
+    # Every result is queued on the loop before run() returns, so the end marker comes last
+    task = loop.run_in_executor(None, run)
+    task.add_done_callback(lambda _: results.put_nowait(None))
+
+    try:
+        while True:
+            result = await results.get()
+            if result is None:
+                break
+            yield result
+
+        await task
+    finally:
+        stop.set()
+        await asyncio.wait([task])
+
+
+# Settings changed through configure(), handed on to shard processes
+settingOverrides = {}
+
+
+# Changes scan settings (the constants at the top, e.g. MAX_RATE=100) for the whole process
+def configure(**settings):
+    for name in settings:
+        if not name.isupper() or name not in globals():
+            raise ValueError(f"Unknown setting: {name}")
+
+    applySettings(settings)
+
+
+def applySettings(settings):
+    globals().update(settings)
+    settingOverrides.update(settings)
+
+
+# Prints the ports that opened or closed since the last scan of the same state file
+def printChanges(changes, file=None):
+    if not changes:
+        print("\n[+] No changes since the last scan", file=file)
+        return
+
+    print("\n[+] Changes since the last scan:", file=file)
+    for change, ip, port, banner in changes:
+        service = COMMON_SERVICES.get(port, "Unknown")
+        label = "[NEW]" if change == "opened" else "[CLOSED]"
+        print(f"{label:<8} {ip:<15} {port:<6} {service:<15} {banner}".rstrip(), file=file)
+
+
+# Writes the changes as JSON Lines, one ScanChange object per line
+def writeChanges(path, changes):
+    with open(path, "w", encoding="utf-8") as f:
+        for change in changes:
+            f.write(json.dumps(change._asdict()) + "\n")
+
+
+# Scan state kept in a JSON file between runs, per host:
+#   done    ports finished in the current run, a 65536 bit bitmap (zlib + base64)
+#   open    open ports and their banners as of the last time each was scanned
+#   offset  where the next incremental slice starts
+# Modes:
+#   full         scans everything and starts a new run
+#   resume       skips the ports the current run already finished
+#   incremental  rescans the known open ports plus the next INCREMENTAL_SLICE of the others
+# Each mode reports what opened or closed, among the ports it scanned, against the open ports on record
+class ScanState:
+    def __init__(self, path, mode="full"):
+        self.path = path
+        self.mode = mode
+        self.hosts = {}
+        self.baseline = {}
+        self.scanned = {}
+        self.lock = threading.Lock()
+        self.lastSave = time.monotonic()
+
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for ip, entry in json.load(f).get("hosts", {}).items():
+                    self.hosts[ip] = {
+                        "done": bytearray(zlib.decompress(base64.b64decode(entry["done"]))),
+                        "open": {int(port): banner for port, banner in entry["open"].items()},
+                        "offset": entry.get("offset", 0),
+                    }
+
+    def host(self, ip):
+        if ip not in self.hosts:
+            self.hosts[ip] = {"done": bytearray(65536 // 8), "open": {}, "offset": 0}
+        return self.hosts[ip]
+
+    # Ports to scan on ip this run, out of ports
+    def plan(self, ip, ports):
+        with self.lock:
+            host = self.host(ip)
+            self.baseline[ip] = dict(host["open"])
+            self.scanned[ip] = bytearray(65536 // 8)
+
+            if self.mode == "resume":
+                done = host["done"]
+                return [port for port in ports if not done[port >> 3] & (1 << (port & 7))]
+
+            # Any other mode starts a new run
+            host["done"] = bytearray(65536 // 8)
+
+            if self.mode != "incremental":
+                return ports
+
+            known = [port for port in ports if port in host["open"]]
+            rest = [port for port in ports if port not in host["open"]]
+            if not rest:
+                return known
+
+            # Rotating slice, every port gets rescanned once every len(rest) / INCREMENTAL_SLICE runs
+            start = host["offset"] % len(rest)
+            rotated = rest[start:] + rest[:start]
+            host["offset"] = start + INCREMENTAL_SLICE
+
+            return known + rotated[:INCREMENTAL_SLICE]
+
+    # Called by the result writer for every finished port
+    def record(self, result):
+        with self.lock:
+            host = self.host(result.ip)
+            port = result.port
+
+            host["done"][port >> 3] |= 1 << (port & 7)
+            if result.ip in self.scanned:
+                self.scanned[result.ip][port >> 3] |= 1 << (port & 7)
+
+            if result.state == "open":
+                host["open"][port] = result.banner
+            else:
+                host["open"].pop(port, None)
+
+        if time.monotonic() - self.lastSave >= STATE_SAVE_INTERVAL:
+            self.save()
+
+    # Writes to a temp file first so an interrupted save never leaves a broken state file
+    def save(self):
+        with self.lock:
+            data = {"version": 1, "hosts": {}}
+            for ip, host in self.hosts.items():
+                data["hosts"][ip] = {
+                    "done": base64.b64encode(zlib.compress(bytes(host["done"]))).decode("ascii"),
+                    "open": {str(port): banner for port, banner in sorted(host["open"].items())},
+                    "offset": host["offset"],
+                }
+
+            tempPath = self.path + ".tmp"
+            with open(tempPath, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tempPath, self.path)
+
+            self.lastSave = time.monotonic()
+
+    # ScanChange tuples for ports scanned this run that opened or closed since the last run
+    def diff(self):
+        changes = []
+
+        with self.lock:
+            for ip, before in self.baseline.items():
+                now = self.hosts[ip]["open"]
+                scanned = self.scanned[ip]
+
+                for port, banner in now.items():
+                    if port not in before:
+                        changes.append(ScanChange("opened", ip, port, banner))
+
+                for port, banner in before.items():
+                    if port not in now and scanned[port >> 3] & (1 << (port & 7)):
+                        changes.append(ScanChange("closed", ip, port, banner))
+
+        return sorted(changes, key=lambda change: (change[1], change[2]))
+
+
+# Token bucket, refills at rate tokens per second up to burst tokens.
+# Takers reserve a token and get back how long to wait before using it,
+# so the same bucket works for threads (time.sleep) and the async engine (asyncio.sleep)
+class TokenBucket:
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, rate / 10)
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+            self.last = now
+
+            # Going negative queues the taker behind everyone who reserved before it
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+# Global and per host connect rate limits, a rate of 0 means no limit
+class RateLimiter:
+    def __init__(self, rate=0, perHostRate=0):
+        self.bucket = TokenBucket(rate) if rate else None
+        self.perHostRate = perHostRate
+        self.hostBuckets = {}
+
+    # Seconds to wait before the next connect to ip may go out
+    def delay(self, ip):
+        delay = 0
+
+        if self.bucket:
+            delay = self.bucket.reserve()
+
+        if self.perHostRate:
+            if ip not in self.hostBuckets:
+                self.hostBuckets[ip] = TokenBucket(self.perHostRate)
+            delay = max(delay, self.hostBuckets[ip].reserve())
+
+        return delay
+
+
+# Live progress line: ports done, percent, ports per second and ETA
+class ScanProgress:
+    def __init__(self, total=0):
+        self.total = total
+        self.start = time.monotonic()
+        self.width = 0
+
+    def render(self, done):
+        elapsed = time.monotonic() - self.start
+        rate = done / elapsed if elapsed else 0
+        eta = (self.total - done) / rate if rate else 0
+        percent = 100 * done / self.total if self.total else 100
+
+        line = f"[+] {done}/{self.total} ports ({percent:.1f}%)  {rate:.0f} ports/s  ETA {int(eta // 60)}m {int(eta % 60)}s"
+        self.width = max(self.width, len(line))
+
+        sys.stderr.write("\r" + line.ljust(self.width))
+        sys.stderr.flush()
+
+    # Wipes the progress line so other output starts on a clean line
+    def clear(self):
+        if self.width:
+            sys.stderr.write("\r" + " " * self.width + "\r")
+            sys.stderr.flush()
+
+
+# Latency histogram with fixed bucket bounds, counts are per bucket (not cumulative)
+class LatencyHistogram:
+    def __init__(self, bounds=None):
+        self.bounds = bounds or METRICS_BUCKETS
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.bounds, seconds)] += 1
+        self.sum += seconds
+
+    def merge(self, counts, total):
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.sum += total
+
+    # Cumulative (upper bound, count) pairs, the last bound is "+Inf"
+    def cumulative(self):
+        return list(zip([str(bound) for bound in self.bounds] + ["+Inf"], itertools.accumulate(self.counts)))
+
+    def summary(self):
+        count = sum(self.counts)
+        return {
+            "count": count,
+            "sum_s": round(self.sum, 6),
+            "mean_s": round(self.sum / count, 6) if count else None,
+            "buckets": dict(self.cumulative()),
+        }
+
+
+# Scan instrumentation: connect and banner outcomes by type, their latency histograms,
+# sockets in flight and per host throughput. Connect latency only covers connects that got
+# an answer, a timeout would just measure the timeout. Retries count as attempts of their own
+CONNECT_OUTCOMES = ["open", "refused", "timeout", "reset", "unreachable", "fd_exhausted", "self_connect", "error"]
+BANNER_OUTCOMES = ["received", "empty", "timeout", "reset", "error"]
+
+
+class ScanMetrics:
+    def __init__(self):
+        self.connects = collections.Counter()
+        self.banners = collections.Counter()
+        self.connectLatency = LatencyHistogram()
+        self.bannerLatency = LatencyHistogram()
+        self.inFlight = 0
+        self.peakInFlight = 0
+        self.hosts = {}
+        self.window = None
+        self.start = time.monotonic()
+        self.startTime = time.time()
+        self.lock = threading.Lock()
+
+    def connect(self, outcome, elapsed=None):
+        with self.lock:
+            self.connects[outcome] += 1
+            if elapsed is not None:
+                self.connectLatency.observe(elapsed)
+
+    def banner(self, outcome, elapsed):
+        with self.lock:
+            self.banners[outcome] += 1
+            self.bannerLatency.observe(elapsed)
+
+    def socketOpened(self):
+        with self.lock:
+            self.inFlight += 1
+            self.peakInFlight = max(self.peakInFlight, self.inFlight)
+
+    def socketClosed(self):
+        with self.lock:
+            self.inFlight -= 1
+
+    # Called by the result writer for every finished port, [ports, first, last] per host
+    def finished(self, ip):
+        now = time.monotonic()
+        host = self.hosts.get(ip)
+        if host is None:
+            self.hosts[ip] = [1, now, now]
+        else:
+            host[0] += 1
+            host[2] = now
+
+    # Plain data for sending the counts of a shard process back to the parent
+    def snapshot(self):
+        with self.lock:
+            return {
+                "connects": dict(self.connects),
+                "banners": dict(self.banners),
+                "connectLatency": (self.connectLatency.counts, self.connectLatency.sum),
+                "bannerLatency": (self.bannerLatency.counts, self.bannerLatency.sum),
+                "peakInFlight": self.peakInFlight,
+            }
+
+    # Shard processes run at the same time, so their peaks are added up
+    def merge(self, snapshot):
+        with self.lock:
+            self.connects.update(snapshot["connects"])
+            self.banners.update(snapshot["banners"])
+            self.connectLatency.merge(*snapshot["connectLatency"])
+            self.bannerLatency.merge(*snapshot["bannerLatency"])
+            self.peakInFlight += snapshot["peakInFlight"]
+
+    def summary(self):
+        with self.lock:
+            hosts = {}
+            for ip, (ports, first, last) in self.hosts.items():
+                elapsed = last - first
+                hosts[ip] = {
+                    "ports": ports,
+                    "elapsed_s": round(elapsed, 6),
+                    "ports_per_second": round(ports / elapsed, 1) if elapsed else None,
+                }
+
+            return {
+                "start": time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.startTime)),
+                "elapsed_s": round(time.monotonic() - self.start, 6),
+                "results": sum(host["ports"] for host in hosts.values()),
+                "connect_outcomes": {outcome: self.connects[outcome] for outcome in CONNECT_OUTCOMES},
+                "banner_outcomes": {outcome: self.banners[outcome] for outcome in BANNER_OUTCOMES},
+                "connect_latency": self.connectLatency.summary(),
+                "banner_latency": self.bannerLatency.summary(),
+                "sockets_in_flight_peak": self.peakInFlight,
+                "concurrency_window": self.window.summary() if self.window else None,
+                "hosts": hosts,
+            }
+
+    # Prometheus text exposition format, for node_exporter's textfile collector
+    def prometheus(self):
+        summary = self.summary()
+        lines = []
+
+        def metric(name, kind, description, samples):
+            lines.append(f"# HELP portscan_{name} {description}")
+            lines.append(f"# TYPE portscan_{name} {kind}")
+            for labels, value in samples:
+                lines.append(f"portscan_{name}{labels} {value}")
+
+        def histogram(name, description, histogram):
+            samples = [(f'_bucket{{le="{bound}"}}', count) for bound, count in histogram.cumulative()]
+            samples.append(("_sum", round(histogram.sum, 6)))
+            samples.append(("_count", sum(histogram.counts)))
+            metric(name, "histogram", description, samples)
+
+        metric("connect_outcomes_total", "counter", "Connect attempts by outcome",
+               [(f'{{outcome="{outcome}"}}', count) for outcome, count in summary["connect_outcomes"].items()])
+        metric("banner_outcomes_total", "counter", "Banner reads by outcome",
+               [(f'{{outcome="{outcome}"}}', count) for outcome, count in summary["banner_outcomes"].items()])
+
+        with self.lock:
+            histogram("connect_latency_seconds", "Time to an answered connect", self.connectLatency)
+            histogram("banner_latency_seconds", "Time spent reading banners", self.bannerLatency)
+
+        metric("sockets_in_flight_peak", "gauge", "Most sockets open at once", [("", summary["sockets_in_flight_peak"])])
+        if summary["concurrency_window"]:
+            metric("concurrency_window", "gauge", "Connect window size by point in the scan",
+                   [(f'{{point="{point}"}}', size) for point, size in summary["concurrency_window"].items() if point != "decreases"])
+            metric("concurrency_window_decreases_total", "counter", "Times the connect window was backed off",
+                   [("", summary["concurrency_window"]["decreases"])])
+        metric("results_total", "counter", "Ports finished", [("", summary["results"])])
+        metric("duration_seconds", "gauge", "Scan run time", [("", summary["elapsed_s"])])
+        metric("start_time_seconds", "gauge", "When the scan started", [("", round(self.startTime, 3))])
+        metric("host_ports_total", "counter", "Ports finished per host",
+               [(f'{{ip="{ip}"}}', host["ports"]) for ip, host in summary["hosts"].items()])
+        metric("host_ports_per_second", "gauge", "Ports finished per second per host",
+               [(f'{{ip="{ip}"}}', host["ports_per_second"] or 0) for ip, host in summary["hosts"].items()])
+
+        return "\n".join(lines) + "\n"
+
+    # Writes the summary, Prometheus text for .prom files and JSON for anything else.
+    # Goes through a temp file so collectors never read a half written file
+    def export(self, path):
+        if os.path.splitext(path)[1].lower() == ".prom":
+            text = self.prometheus()
+        else:
+            text = json.dumps(self.summary(), indent=2) + "\n"
+
+        tempPath = path + ".tmp"
+        with open(tempPath, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tempPath, path)
+
+
+# One scanned port, ports that answered carry the connect time and open ones any banner.
+# host holds the target names behind the IP and is filled in by the collector
+ScanResult = collections.namedtuple("ScanResult", ["host", "ip", "port", "state", "service", "banner", "rtt"])
+
+RESULT_FIELDS = ScanResult._fields
+
+# A port that opened or closed since the last scan on record (see ScanState.diff)
+ScanChange = collections.namedtuple("ScanChange", ["change", "ip", "port", "banner"])
+
+
+def makeResult(ip, port, state, banner=None, rtt=None):
+    service = COMMON_SERVICES.get(port, "Unknown")
+    return ScanResult("", ip, port, state, service, banner or "", round(rtt, 6) if rtt is not None else None)
+
+
+# Collects results from every worker (thread or async) on a queue.
+# A single writer thread drains it into the sinks, so output never interleaves
+# and nothing is held in memory once it has been written.
+# The writer also owns the progress line and the per host counts, since it sees every finished port
+class ResultCollector:
+    def __init__(self, sinks, reportClosed=None, state=None, metrics=None):
+        self.sinks = sinks
+        self.state = state
+        self.metrics = metrics or ScanMetrics()
+        self.reportClosed = REPORT_CLOSED if reportClosed is None else reportClosed
+        self.queue = queue.Queue()
+        self.writer = threading.Thread(target=self.drain, daemon=True)
+        self.completed = 0
+        self.names = {}
+
+        showProgress = SHOW_PROGRESS and sys.stderr.isatty()
+        self.progress = ScanProgress() if showProgress else None
+
+    def start(self):
+        self.writer.start()
+
+    # Registers a host joining the scan, its names label the results and its ports count towards progress
+    def addHost(self, ip, names, portCount):
+        self.names[ip] = names
+        if self.progress:
+            self.progress.total += portCount
+
+    def add(self, result):
+        self.queue.put(result)
+
+    def drain(self):
+        lastRender = 0
+
+        while True:
+            try:
+                result = self.queue.get(timeout=PROGRESS_INTERVAL)
+            except queue.Empty:
+                result = False
+
+            if result is None:
+                break
+
+            if result:
+                self.completed += 1
+                self.metrics.finished(result.ip)
+
+                if self.state:
+                    self.state.record(result)
+
+                if result.state == "open" or self.reportClosed:
+                    # Set difference runs in one step, so names can keep growing on the scan thread
+                    names = self.names.get(result.ip, set()) - {result.ip}
+                    result = result._replace(host=";".join(sorted(names)))
+
+                    if self.progress:
+                        self.progress.clear()
+
+                    for sink in self.sinks:
+                        sink.write(result)
+
+            if self.progress and time.monotonic() - lastRender >= PROGRESS_INTERVAL:
+                self.progress.render(self.completed)
+                lastRender = time.monotonic()
+
+        if self.progress:
+            self.progress.clear()
+
+        if self.state:
+            self.state.save()
+
+    # Waits for everything queued to be written, then closes the sinks
+    def close(self):
+        self.queue.put(None)
+        self.writer.join()
+
+        for sink in self.sinks:
+            sink.close()
+
+
+# Keeps results in memory, shard processes use it to send a whole shard back at once.
+# Closed ports are kept too so the parent can count them for progress
+class ResultBuffer:
+    def __init__(self):
+        self.results = []
+        self.metrics = ScanMetrics()
+
+    def add(self, result):
+        self.results.append(result)
+
+
+# Hands every result to a function, scan() uses it to feed its queue
+class QueueSink:
+    def __init__(self, put):
+        self.put = put
+
+    def write(self, result):
+        self.put(result)
+
+    def close(self):
         pass
 
-# Single thread worker
-def worker(ip, portQueue):
-    # Each thread runs this function, it pulls ports from the queue and scans them
-    while not portQueue.empty():
-        port = portQueue.get()
-        connection(ip, port)
-        portQueue.task_done()
+
+# Prints open ports as they are found
+class ConsoleSink:
+    def write(self, result):
+        if result.state != "open":
+            return
+
+        if result.banner:
+            print(f"[OPEN] {result.ip:<15} {result.port:<6} {result.service:<15} {result.banner}")
+        else:
+            print(f"[OPEN] {result.ip:<15} {result.port:<6} {result.service:<15}")
+
+    def close(self):
+        pass
+
+
+# Streams results to a CSV file, one row per result
+class CsvSink:
+    def __init__(self, path):
+        self.file = open(path, "w", newline="", encoding="utf-8", buffering=WRITE_BUFFER)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(RESULT_FIELDS)
+
+    def write(self, result):
+        self.writer.writerow(result)
+
+    def close(self):
+        self.file.close()
+
+
+# Streams results as JSON Lines (NDJSON), one object per line.
+# Takes a path or an open stream, streams (stdout) are flushed every line so readers see results right away
+class JsonlSink:
+    def __init__(self, path):
+        self.stream = not isinstance(path, str)
+        self.file = path if self.stream else open(path, "w", encoding="utf-8", buffering=WRITE_BUFFER)
+
+    def write(self, result):
+        self.file.write(json.dumps(result._asdict()) + "\n")
+        if self.stream:
+            self.file.flush()
+
+    def close(self):
+        if not self.stream:
+            self.file.close()
+
+
+# Picks the sink from the file extension, "-" writes JSON Lines to stdout
+def makeSink(path):
+    if path == "-":
+        return JsonlSink(sys.stdout)
+
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == ".csv":
+        return CsvSink(path)
+    if extension in EXPORT_EXTENSIONS:
+        return JsonlSink(path)
+
+    raise ValueError(f"Unsupported export format: {path} (use .csv, .jsonl or .ndjson)")
 
 
-# Thread controller
-def scanPorts(ip, startPort, endPort):
-    portQueue = queue.Queue()
+# Asks the user whether hosts have to answer a quick check before they are scanned
+def getDiscovery():
+    ports = ", ".join(str(port) for port in DISCOVERY_PORTS)
+    choice = input(f"\nOnly scan hosts that answer on {ports}? (y/n, n scans everything) ").strip().lower()
 
-    # Add all ports to the queue
-    for port in range(startPort, endPort + 1):
-        portQueue.put(port)
+    return choice != "n"
 
-    # Number of threads
-    threadCount = 100
 
-    # Start worker threads
-    for _ in range(threadCount):
-        t = threading.Thread(target=worker, args=(ip, portQueue))
-        t.daemon = True
-        t.start()
+# Asks the user for a state file and how to use it, blank skips keeping state
+def getStateFile():
+    path = input("\nState file for resumable and incremental scans (blank to skip): ").strip()
 
-    # Wait until all ports are scanned
-    portQueue.join()
+    if not path:
+        return None, "full"
 
-def runScanner(ip):
-    startPort, endPort = getPortRange()
+    if not os.path.exists(path):
+        return path, "full"
 
-    print(f"\n [+] Scanning Ports {startPort} to {endPort} on {ip}\n")
+    while True:
+        mode = input("Mode: full, resume or incremental? ").strip().lower() or "full"
+        if mode in ("full", "resume", "incremental"):
+            return path, mode
+
+        print("[-] Pick full, resume or incremental")
+
+
+# Asks the user for export files, blank skips exporting
+def getExportPaths():
+    while True:
+        user_input = input("\nExport results to (.csv, .jsonl or .ndjson, comma separated, blank to skip): ").strip()
+
+        paths = [path.strip() for path in user_input.split(",") if path.strip()]
+        unsupported = [path for path in paths if os.path.splitext(path)[1].lower() not in EXPORT_EXTENSIONS]
+
+        if not unsupported:
+            return paths
+
+        print(f"[-] Unsupported export format: {', '.join(unsupported)}")
 
-    scanPorts(ip, startPort, endPort)
+def runScanner(targets):
+    ports, topN = getPortRange()
+
+    print(f"\n [+] Scanning Ports {ports[0]} to {ports[-1]} on {', '.join(targets)}\n")
+
+    scanPorts(targets, ports, topN=topN)
 
     print("\n[+] Scan Complete")
 
@@ -198,18 +1915,59 @@ COMMON_SERVICES = {
 }
 
 
-def getBanner(ip, port):
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(1)
-        s.connect((ip, port))
+# TCP ports ranked by how often they are found open on the internet
+# (the nmap-services frequency table), most common first
+TOP_PORTS = [
+    80, 23, 443, 21, 22, 25, 3389, 110, 445, 139,
+    143, 53, 135, 3306, 8080, 1723, 111, 995, 993, 5900,
+    1025, 587, 8888, 199, 1720, 465, 548, 113, 81, 6001,
+    10000, 514, 5060, 179, 1026, 2000, 8443, 8000, 32768, 554,
+    26, 1433, 49152, 2001, 515, 8008, 49154, 1027, 5666, 646,
+    5000, 5631, 631, 49153, 8081, 2049, 88, 79, 5800, 106,
+    2121, 1110, 49155, 6000, 513, 990, 5357, 427, 49156, 543,
+    544, 5101, 144, 7, 389, 8009, 3128, 444, 9999, 5009,
+    7070, 5190, 3000, 5432, 1900, 3986, 13, 1029, 9, 5051,
+    6646, 49157, 1028, 873, 1755, 2717, 4899, 9100, 119, 37,
+]
+
+# Scan priority: the frequency table, then any COMMON_SERVICES port it does not cover
+RANKED_PORTS = TOP_PORTS + [port for port in COMMON_SERVICES if port not in TOP_PORTS]
 
+
+# Reads a banner from a socket that is already connected
+def getBanner(s, metrics=None):
+    start = time.monotonic()
+    outcome = "error"
+
+    try:
         banner = s.recv(1024)
-        s.close()
+        outcome = "received" if banner else "empty"
 
         return banner.decode(errors="ignore").strip()
-    except:
+    except OSError as error:
+        outcome = errorOutcome(error)
         return None
+    finally:
+        if metrics:
+            metrics.banner(outcome, time.monotonic() - start)
+
+
+async def asyncGetBanner(s, timeout=BANNER_TIMEOUT, metrics=None):
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    outcome = "error"
+
+    try:
+        banner = await asyncio.wait_for(loop.sock_recv(s, 1024), timeout)
+        outcome = "received" if banner else "empty"
+
+        return banner.decode(errors="ignore").strip()
+    except (OSError, asyncio.TimeoutError) as error:
+        outcome = errorOutcome(error)
+        return None
+    finally:
+        if metrics:
+            metrics.banner(outcome, loop.time() - start)
 
 
 
@@ -222,26 +1980,39 @@ def main():
         # Show home screen
         homeScreen()
 
-        # Ask for a target
-        ip = getTarget()
+        # Ask for the targets
+        targets = getTarget()
 
-        # If target is invalid restart loop
-        if ip is None:
+        # If no target is valid restart loop
+        if targets is None:
             continue
 
-        # Check if the host is reachable
-        #if not checkHost(ip):
-        #    print("[-] Skipping Scan")
-        #    continue
-
         # Ask for port range
-        startPort, endPort = getPortRange()
+        ports, topN = getPortRange()
 
-        print(f"\n[+] Starting scan on {ip}")
-        print(f"[+] Ports {startPort} to {endPort}\n")
+        # Ask whether to skip hosts that do not answer
+        discovery = getDiscovery()
 
-        # Multithreaded port scan
-        scanPorts(ip, startPort, endPort)
+        # Ask where to export results
+        exportPaths = getExportPaths()
+
+        # Ask for a state file to resume or diff against
+        statePath, stateMode = getStateFile()
+
+        print(f"\n[+] Starting scan on {len(targets)} target(s)")
+        if topN:
+            print(f"[+] Top {topN} ports\n")
+        elif len(ports) == ports[-1] - ports[0] + 1:
+            print(f"[+] Ports {ports[0]} to {ports[-1]}\n")
+        else:
+            print(f"[+] {len(ports)} ports from {ports[0]} to {ports[-1]}\n")
+
+        # Concurrent port scan (async engine, or threads as a fallback)
+        scanPorts(targets, ports, exportPaths=exportPaths, discovery=discovery, topN=topN,
+                  statePath=statePath, stateMode=stateMode)
+
+        for path in exportPaths:
+            print(f"[+] Results exported to {path}")
 
         # Ask user if they want to run another scan
         choice = input("\nScan another target? (y/n) ").strip().lower()
@@ -251,8 +2022,84 @@ def main():
             break
 
 
+# Command line options, every one of them has a matching scanPorts keyword or setting
+def parseArgs(argv):
+    parser = argparse.ArgumentParser(description="TCP port scanner, run without arguments for the interactive prompts")
+    parser.add_argument("targets", nargs="+", help="names, IPs, CIDR ranges (10.0.0.0/24) or target files (@targets.txt)")
+    parser.add_argument("-p", "--ports", default="1-1024", help="range, list or topN, e.g. 20-8080, 22,80,443 or top100 (default 1-1024)")
+    parser.add_argument("-e", "--engine", choices=["async", "thread", "shard"], default=SCAN_ENGINE)
+    parser.add_argument("--order", choices=["priority", "sequential"], default=PORT_ORDER)
+    parser.add_argument("--no-discovery", dest="discovery", action="store_false", default=HOST_DISCOVERY, help="scan hosts that do not answer the discovery probes")
+    parser.add_argument("-o", "--output", action="append", default=[], metavar="PATH",
+                        help="export to .csv, .jsonl or .ndjson, - writes JSON Lines to stdout (repeatable)")
+    parser.add_argument("--report-closed", action="store_true", help="also export closed and filtered ports")
+    parser.add_argument("--state", metavar="PATH", help="state file for resumable and incremental scans")
+    parser.add_argument("--mode", choices=["full", "resume", "incremental"], default="full", help="how the state file is used")
+    parser.add_argument("--diff", metavar="PATH", help="write the ports that opened or closed since the last scan here as JSON Lines (needs --state)")
+    parser.add_argument("--metrics", metavar="PATH", help="write scan metrics here, Prometheus text for .prom and JSON otherwise")
+    parser.add_argument("-c", "--concurrency", type=int, default=MAX_CONCURRENCY, help="connects in flight (async and shard engines)")
+    parser.add_argument("--per-host", type=int, default=PER_HOST_CONCURRENCY, help="connects in flight against one host")
+    parser.add_argument("--threads", type=int, default=THREAD_COUNT, help="worker threads for the thread engine")
+    parser.add_argument("--processes", type=int, default=SHARD_PROCESSES, help="processes for the shard engine")
+    parser.add_argument("--rate", type=float, default=MAX_RATE, help="connects per second, 0 for no limit")
+    parser.add_argument("--per-host-rate", type=float, default=PER_HOST_RATE, help="connects per second against one host, 0 for no limit")
+    parser.add_argument("--timeout", type=float, default=CONNECT_TIMEOUT, help="connect timeout until a host's RTT is known")
+    parser.add_argument("--retries", type=int, default=MAX_RETRIES, help="extra tries for ports that timed out")
+    parser.add_argument("--no-autotune", dest="autotune", action="store_false", default=AUTOTUNE,
+                        help="keep the connect window fixed instead of backing off on fd exhaustion and timeouts")
+    parser.add_argument("-q", "--quiet", action="store_true", help="no console output for open ports")
+    parser.add_argument("--no-progress", dest="progress", action="store_false", help="no progress line on stderr")
+    return parser.parse_args(argv)
+
+
+# Non-interactive scan for cron and scripts. Exit status is 0 when the scan finished,
+# 2 for bad arguments and 130 when it was cancelled
+def cli(argv):
+    args = parseArgs(argv)
+
+    targets = parseTargets(" ".join(args.targets))
+    if not targets:
+        print("[-] No valid targets", file=sys.stderr)
+        return 2
+
+    try:
+        ports, topN = parsePorts(args.ports)
+        for path in args.output:
+            if path != "-" and os.path.splitext(path)[1].lower() not in EXPORT_EXTENSIONS:
+                raise ValueError(f"Unsupported export format: {path} (use .csv, .jsonl or .ndjson)")
+        if args.diff and not args.state:
+            raise ValueError("--diff needs a state file (--state)")
+    except ValueError as error:
+        print(f"[-] {error}", file=sys.stderr)
+        return 2
+
+    configure(MAX_CONCURRENCY=args.concurrency, PER_HOST_CONCURRENCY=args.per_host, THREAD_COUNT=args.threads,
+              SHARD_PROCESSES=args.processes, MAX_RATE=args.rate, PER_HOST_RATE=args.per_host_rate,
+              CONNECT_TIMEOUT=args.timeout, MAX_RETRIES=args.retries, AUTOTUNE=args.autotune,
+              SHOW_PROGRESS=args.progress)
+
+    # Results on stdout leave no room for the console lines
+    console = not args.quiet and "-" not in args.output
+
+    # The changes still get reported when the console lines are off, on stderr unless -q
+    def reportChanges(changes):
+        if args.diff:
+            writeChanges(args.diff, changes)
+        if not console and not args.quiet:
+            printChanges(changes, sys.stderr)
+
+    finished = scanPorts(targets, ports, engine=args.engine, exportPaths=args.output, discovery=args.discovery,
+                         order=args.order, topN=topN, statePath=args.state, stateMode=args.mode,
+                         reportClosed=args.report_closed or None, console=console, metricsPath=args.metrics,
+                         onChanges=reportChanges)
+
+    return 0 if finished else 130
+
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(cli(sys.argv[1:]))
+
     main()
 
 